@@ -1,9 +1,12 @@
 import streamlit as st
-from data import get_data, get_teams
-from bracket import get_bracket_games, get_team_seeds, BRACKET_URL
-from time_weighting import input_time_weights
-from ranker import ColleyRanker, MasseyRanker, RankingOptions
-import pandas as pd
+from data import get_registry
+from ratings import get_matchup_matrix, get_ratings, warm_ratings_cache
+from bracket import get_bracket_games, get_team_seeds, fetch_bracket_html, \
+    BRACKET_URL
+from time_weighting import input_time_decay, input_time_weights
+from ranker import RANKERS, RankingOptions
+from tournament import Tournament
+from instrumentation import Trace, span
 import numpy as np
 
 # Configure the streamlit app
@@ -12,6 +15,8 @@ st.set_page_config(
     layout="wide"
 )
 
+warm_ratings_cache()
+
 st.title("March Madness 2023")
 """
 This app provides a frontend for using the [Colley](https://en.wikipedia.org/wiki/Colley_Matrix) and [Massey](https://masseyratings.com/theory/massey.htm) ranking algorithms to inform selection of the outcomes of the NCAA March Madness bracket. The Colley algorithm is a simple ranking algorithm that does not account for point differential, while the Massey algorithm does. The Massey algorithm is more accurate, but it is also more computationally expensive. The Colley algorithm is much faster, but it is less accurate. The Massey algorithm is also more sensitive to the weights assigned to home, away, and neutral wins.
@@ -33,10 +38,13 @@ st.header("Ranking Parameters")
 form_col_1, form_col_2 = st.columns(2)
 method = form_col_1.selectbox(
     "Choose a ranking method",
-    ["Colley", "Massey"],
+    list(RANKERS),
     index=0,
-    format_func=lambda x:
-        x + " (accounts for point differential)" if x == "Massey" else x
+    format_func=lambda x: {
+        "Massey": x + " (accounts for point differential)",
+        "Elo": x + " (updates game by game, scaled by margin)",
+        "Bradley-Terry": x + " (ratings are log-odds of winning)",
+    }.get(x, x)
 )
 home_win_weight = form_col_2.slider(
     "Home win weight", value=1.0, min_value=0.0, max_value=2.0, step=0.01)
@@ -51,10 +59,19 @@ neutral_win_weight = form_col_2.slider(
 )   
 
 use_time_weights = form_col_1.checkbox("Use time-based weights", value=True,help="If checked, the ranking algorithm will use time-based weights. If unchecked, all games will be weighted equally.")
+time_decay = None
 if use_time_weights:
-    form_col_1.caption("Note: the dates shown in this table should not be edited — only the weights themselves.")
-    time_weight_df = input_time_weights(parent=form_col_1)
-    time_weights = time_weight_df["weight"].to_list()
+    schedule = form_col_1.selectbox(
+        "Time weighting",
+        ["Segments", "Exponential decay", "Linear ramp"],
+        help="Segments weights equal spans of the season; the others "
+             "weight every game by how late in the season it was played.")
+    if schedule == "Segments":
+        form_col_1.caption("Note: the dates shown in this table should not be edited — only the weights themselves.")
+        time_weight_df = input_time_weights(parent=form_col_1)
+        time_weights = time_weight_df["weight"].to_list()
+    else:
+        time_decay = input_time_decay(schedule, parent=form_col_1)
 
 """
 
@@ -66,114 +83,110 @@ clear_cache = st.button("Clear Cache", type="secondary")
 
 if clear_cache:
     st.cache_data.clear()
+    st.cache_resource.clear()
+    # Pick up First Four results posted since the page was saved
+    fetch_bracket_html(BRACKET_URL, refresh=True)
+
+show_diagnostics = st.sidebar.checkbox(
+    "Show diagnostics",
+    help="Time each stage of the bracket run (wall time, CPU time, peak "
+         "memory and cache hits)."
+)
 
 if clear_bracket:
     run_bracket = False
 
-if run_bracket:
-
-    opts = RankingOptions(
-        weight_home_win=home_win_weight,
-        weight_away_win=away_win_weight,
-        weight_neutral_win=neutral_win_weight,
-        use_time_weights=use_time_weights,
-        segment_weights=time_weights if use_time_weights else [1],
-    )
-    data = get_data()
-    teams = get_teams()
-
-    # Ranking Algorithms
-    colley = ColleyRanker(data, teams, opts)
-    colley_results = colley.process()
-    massey = MasseyRanker(data, teams, opts)
-    massey_results = massey.process()
-
-    ALGO_MAP = {
-        "Colley": colley_results,
-        "Massey": massey_results,
-    }
-
-    bracket = get_bracket_games(BRACKET_URL)
-
-    # Make team_1_name and team_2_name columns null if round != 1
-    bracket.loc[bracket["round"] != 1, [
-        "team_1_seed",
-        "team_1_name",
-        "team_2_seed",
-        "team_2_name"]] = None
-
-    def decide_by_seeds(row):
-        if row["team_1_seed"] < row["team_2_seed"]:
-            return 1
-        elif row["team_2_seed"] < row["team_1_seed"]:
-            return 2
-        else:
-            return np.random.choice([1, 2])
-
-    def decide_by_algorithm(row):
-        results = ALGO_MAP[method]
-
-        team_1_name = row["team_1_name"].split("/")[0] if "/" in row["team_1_name"] else row["team_1_name"]
-        team_2_name = row["team_2_name"].split("/")[0] if "/" in row["team_2_name"] else row["team_2_name"]
-
-        team_1_rating = results.loc[results["team"] == team_1_name, "rating"].values[0]
-        team_2_rating = results.loc[results["team"] == team_2_name, "rating"].values[0]
-
-        return 1 if team_1_rating > team_2_rating else 2
-
-    # Play the bracket
-
-    for i in range(len(bracket)):
-        row = bracket.iloc[i]
-        winning_team = decide_by_algorithm(row)
-
-        which_spot = 1 if row["round_game_number"] % 2 == 1 else 2
-
-        if row["next_round"] == 5:
-            which_spot = 1 if row["region_name"] in ["South", "Midwest"] else 2
+opts = RankingOptions(
+    weight_home_win=home_win_weight,
+    weight_away_win=away_win_weight,
+    weight_neutral_win=neutral_win_weight,
+    use_time_weights=use_time_weights,
+    segment_weights=time_weights
+    if use_time_weights and time_decay is None else [1],
+    time_decay=time_decay,
+)
 
-        bracket.loc[i, ["team_1_win", "team_2_win"]] = (
-            True if winning_team == 1 else False,
-            True if winning_team == 2 else False
+if run_bracket:
+    trace = Trace(memory=True) if show_diagnostics else None
+    try:
+        registry = get_registry()
+
+        # Only the selected method is solved, and only if no session has
+        # already asked for these options
+        results = get_ratings(method, opts)
+
+        bracket = get_bracket_games(BRACKET_URL)
+
+        def decide_by_seeds(row):
+            if row["team_1_seed"] < row["team_2_seed"]:
+                return 1
+            elif row["team_2_seed"] < row["team_1_seed"]:
+                return 2
+            else:
+                return np.random.choice([1, 2])
+
+        # Play the bracket: the higher-rated team wins each game, with First
+        # Four ("A/B") slots decided the same way.
+        with span("bracket_play"):
+            tournament = Tournament(bracket, registry)
+            slots, winner_spot = tournament.play(
+                tournament.team_ratings(results))
+            bracket = tournament.to_frame(slots, winner_spot)
+
+
+        """
+        ## Predicted Game Results
+
+        You can use the game outcomes in the dataframe below to fill out your bracket region-by-region, round-by-round, and then complete the Final Four.
+        """
+
+        st.dataframe(bracket, height=1500)
+
+        st.write(f"""
+        The winner of the tournament is **{
+            bracket.iloc[-1, :][
+                "team_1_name" if bracket.iloc[-1, :]["team_1_win"] else "team_2_name"
+            ]
+        }**!
+        """)
+
+        seeded_teams = get_team_seeds()
+
+        rating_results = seeded_teams.assign(
+            rank=results.rank_of(seeded_teams["team"]),
+            rating=results.rating_of(seeded_teams["team"]),
         )
+        rating_results.sort_values(by="rating", ascending=False, inplace=True)
 
-        if np.isnan(row["next_game_index"]):
-            continue
-        bracket.loc[row["next_game_index"], [
-            f"team_{which_spot}_seed",
-            f"team_{which_spot}_name",
-        ]] = row[f"team_{winning_team}_seed"], row[f"team_{winning_team}_name"]
-
-
-    """
-    ## Predicted Game Results
+        """
+        ### Rating results
 
-    You can use the game outcomes in the dataframe below to fill out your bracket region-by-region, round-by-round, and then complete the Final Four.
-    """
+        The table below shows the actual rating values assigned to each team in the bracket by the algorithm and set of parameters you specified.
+        """
+        st.dataframe(rating_results)
+    finally:
+        # Stop tracemalloc even when the run fails
+        if trace is not None:
+            trace.end()
 
-    st.dataframe(bracket, height=1500)
-
-    st.write(f"""
-    The winner of the tournament is **{
-        bracket.iloc[-1, :][
-            "team_1_name" if bracket.iloc[-1, :]["team_1_win"] else "team_2_name"
-        ]
-    }**!
-    """)
+    if trace is not None:
+        with st.expander("Diagnostics", expanded=True):
+            st.dataframe(trace.to_frame())
 
+"""
+---
+### Head-to-head
+"""
+if st.checkbox("Compare two tournament teams"):
     seeded_teams = get_team_seeds()
+    h2h_col_1, h2h_col_2 = st.columns(2)
+    team_a = h2h_col_1.selectbox("Team", seeded_teams["team"], index=0)
+    team_b = h2h_col_2.selectbox("Opponent", seeded_teams["team"], index=1)
 
-    rating_results = pd.merge(
-        seeded_teams,
-        ALGO_MAP[method],
-        how="left",
-        on="team"
-    )
-    rating_results.sort_values(by="rating", ascending=False, inplace=True)
-
-    """
-    ### Rating results
+    matchups = get_matchup_matrix(method, opts, seeded_teams["team"])
 
-    The table below shows the actual rating values assigned to each team in the bracket by the algorithm and set of parameters you specified.
-    """
-    st.dataframe(rating_results)
+    st.metric(
+        f"{team_a} win probability",
+        f"{matchups.win_probability(team_a, team_b):.1%}",
+        f"{matchups.predicted_margin(team_a, team_b):+.3f} rating margin",
+    )
@@ -0,0 +1,233 @@
+"""
+Score ranking configurations against past tournaments.
+
+Each season is rated only on games played before its tournament started,
+the bracket is played with the resulting ratings, and the picks are scored
+against what actually happened (tournament games in the Massey feed).
+
+    python backtest.py 2022 2023 --workers 4 --output backtest.csv
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from bracket import BRACKET_URL_TEMPLATE, fetch_brackets, parse_bracket_html
+from data import TEAM_NAME_MAPPINGS, load_season
+from ranker import RANKERS, RankingOptions
+from registry import TeamRegistry
+from tournament import Tournament
+
+# Standard bracket scoring: points per correct pick in each round. First
+# Four games are not scored.
+ROUND_POINTS = {0: 0, 1: 10, 2: 20, 3: 40, 4: 80, 5: 160, 6: 320}
+
+# Scenarios rated together in one process_batch call per task
+OPTIONS_PER_TASK = 50
+
+
+@dataclass
+class Season:
+    year: int
+    games: pd.DataFrame
+    teams: pd.DataFrame
+    registry: TeamRegistry
+    tournament: Tournament
+    # Tournament games as field team indices
+    winners: np.ndarray
+    losers: np.ndarray
+    # Actual winner of each bracket game (field team index, -1 if unknown)
+    actual: np.ndarray
+
+
+def actual_winners(
+        tournament: Tournament,
+        results: dict[tuple[int, int], int]
+) -> np.ndarray:
+    """
+    Walk the bracket using real results, keyed by (lower, higher) field
+    team index. Games not found in `results` and everything downstream of
+    them are marked -1.
+    """
+    slots = tournament.slots.copy()
+    winners = np.full(tournament.num_games, -1, dtype=np.intp)
+
+    for games in tournament.round_games:
+        for g in games:
+            a, b = slots[g]
+            if a < 0 or b < 0:
+                continue
+            winner = results.get((min(a, b), max(a, b)), -1)
+            winners[g] = winner
+            if tournament.next_game[g] >= 0:
+                slots[tournament.next_game[g], tournament.next_spot[g]] = \
+                    winner
+    return winners
+
+
+@lru_cache(maxsize=None)
+def load_backtest_season(year: int) -> Season:
+    # Cached per process: every task for a season reuses the same data
+    games, teams = load_season(year)
+    registry = TeamRegistry(teams, aliases=TEAM_NAME_MAPPINGS)
+
+    url = BRACKET_URL_TEMPLATE.format(year=year)
+    bracket = parse_bracket_html(fetch_brackets([url])[url])
+    tournament = Tournament(bracket, registry)
+
+    field_index = np.full(len(registry), -1, dtype=np.intp)
+    field_index[tournament.registry_index] = np.arange(tournament.num_teams)
+    team_1 = field_index[games["team_1_index"].to_numpy()]
+    team_2 = field_index[games["team_2_index"].to_numpy()]
+    team_1_win = games["team_1_score"].to_numpy() \
+        > games["team_2_score"].to_numpy()
+    days = games["days_since_timestart"].to_numpy()
+
+    # Every opening pairing (First Four or first round) last meets in the
+    # tournament itself, so the tournament starts on the earliest of those
+    # last meetings. Earlier meetings in the season are ignored.
+    opening = tournament.slots[tournament.round <= 1]
+    opening_pairs = {
+        (min(a, b), max(a, b)) for a, b in opening if a >= 0 and b >= 0}
+    last_meeting = {}
+    for a, b, day in zip(team_1, team_2, days):
+        pair = (min(a, b), max(a, b))
+        if pair in opening_pairs:
+            last_meeting[pair] = max(day, last_meeting.get(pair, day))
+    if not last_meeting:
+        raise ValueError(f"No {year} tournament games in the games feed")
+    start_day = min(last_meeting.values())
+
+    in_tournament = (days >= start_day) & (team_1 >= 0) & (team_2 >= 0)
+    winners = np.where(team_1_win, team_1, team_2)[in_tournament]
+    losers = np.where(team_1_win, team_2, team_1)[in_tournament]
+
+    return Season(
+        year=year,
+        games=games[days < start_day].reset_index(drop=True),
+        teams=teams,
+        registry=registry,
+        tournament=tournament,
+        winners=winners,
+        losers=losers,
+        actual=actual_winners(tournament, {
+            (min(w, l), max(w, l)): w for w, l in zip(winners, losers)
+        }),
+    )
+
+
+def score_season(
+        year: int,
+        method: str,
+        options_list: list[RankingOptions],
+        first_config: int = 0
+) -> list[dict]:
+    season = load_backtest_season(year)
+    tournament = season.tournament
+
+    ranker = RANKERS[method](
+        season.games, season.teams, options_list[0], registry=season.registry)
+    field_ratings = ranker.process_batch(options_list)[
+        :, tournament.registry_index]
+
+    points = np.array([ROUND_POINTS[r] for r in tournament.round])
+    known = season.actual >= 0
+
+    rows = []
+    for s, ratings in enumerate(field_ratings):
+        slots, winner_spot = tournament.play(ratings)
+        picks = slots[np.arange(tournament.num_games), winner_spot]
+        correct = known & (picks == season.actual)
+
+        rows.append({
+            "season": year,
+            "method": method,
+            "config": first_config + s,
+            "bracket_points": int(points[correct].sum()),
+            "max_points": int(points[known].sum()),
+            "correct_picks": int(correct[tournament.round > 0].sum()),
+            "games": len(season.winners),
+            "correct_games": int(np.sum(
+                ratings[season.winners] > ratings[season.losers])),
+        })
+    return rows
+
+
+def _score_task(args) -> list[dict]:
+    return score_season(*args)
+
+
+def run_backtest(
+        years: list[int],
+        options_list: list[RankingOptions],
+        methods: list[str] = tuple(RANKERS),
+        workers: int = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Score every (season, method, configuration) and return the per-season
+    results together with a summary averaged over seasons.
+    """
+    tasks = [
+        (year, method, options_list[start:start + OPTIONS_PER_TASK], start)
+        for year in years
+        for method in methods
+        for start in range(0, len(options_list), OPTIONS_PER_TASK)
+    ]
+
+    if workers == 1:
+        results = map(_score_task, tasks)
+        rows = [row for task_rows in results for row in task_rows]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = [
+                row
+                for task_rows in pool.map(_score_task, tasks)
+                for row in task_rows
+            ]
+
+    per_season = pd.DataFrame(rows)
+    per_season["accuracy"] = per_season["correct_games"] / per_season["games"]
+
+    summary = per_season.groupby(["method", "config"], as_index=False).agg(
+        seasons=("season", "nunique"),
+        bracket_points=("bracket_points", "mean"),
+        max_points=("max_points", "mean"),
+        correct_games=("correct_games", "sum"),
+        games=("games", "sum"),
+    )
+    summary["accuracy"] = summary["correct_games"] / summary["games"]
+
+    configs = pd.DataFrame([
+        {
+            "config": i,
+            "weight_home_win": options.weight_home_win,
+            "weight_away_win": options.weight_away_win,
+            "weight_neutral_win": options.weight_neutral_win,
+            "segment_weights": list(options.segment_weights),
+        }
+        for i, options in enumerate(options_list)
+    ])
+    summary = summary.merge(configs, on="config", how="left")
+    summary.sort_values(
+        by=["bracket_points", "accuracy"], ascending=False, inplace=True)
+    summary.reset_index(drop=True, inplace=True)
+    return per_season, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("years", type=int, nargs="+")
+    parser.add_argument("--methods", nargs="+", default=list(RANKERS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="write per-season results as CSV")
+    args = parser.parse_args()
+
+    per_season, summary = run_backtest(
+        args.years, [RankingOptions()], args.methods, args.workers)
+    if args.output:
+        per_season.to_csv(args.output, index=False)
+    print(summary.to_string())
@@ -0,0 +1,107 @@
+"""
+Compare the per-row ingestion path that get_games/get_data used to take
+against the vectorized one, on the repo's games.csv.
+
+    python benchmarks/ingestion.py [--repeat N]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime as dt
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytz
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from data import GAMES_DTYPES, merge_games, prepare_games, prepare_teams  # noqa: E402
+
+
+def legacy_prepare_games(games: pd.DataFrame) -> pd.DataFrame:
+    games = games.copy()
+    games["team_1_homefield"] = games["team_1_homefield"].apply(
+        lambda x: 1 if x == 1 else 0
+    )
+    games["team_2_homefield"] = games["team_2_homefield"].apply(
+        lambda x: 1 if x == 1 else 0
+    )
+    games["date"] = games["date"].apply(
+        lambda x: dt.strptime(str(x), "%Y%m%d")
+        .astimezone(pytz.timezone("US/Eastern"))
+    )
+    return games
+
+
+def legacy_merge_games(games: pd.DataFrame, teams: pd.DataFrame):
+    games = games.merge(
+        teams, left_on="team_1_id", right_on="team_id", how="left")
+    games = games.merge(
+        teams, left_on="team_2_id", right_on="team_id", how="left")
+    games.drop(columns=["team_id_x", "team_id_y"], inplace=True)
+    games.rename(
+        columns={"team_name_x": "team_1_name", "team_name_y": "team_2_name"},
+        inplace=True
+    )
+    games = games.applymap(
+        lambda x: x.strip() if isinstance(x, str) else x
+    )
+    games.loc[:, "team_1_win"] = games["team_1_score"] > games["team_2_score"]
+    games.loc[:, "team_2_win"] = games["team_2_score"] > games["team_1_score"]
+    games.loc[:, "winning_score"] = games[
+        ["team_1_score", "team_2_score"]].max(axis=1)
+    games.loc[:, "losing_score"] = games[
+        ["team_1_score", "team_2_score"]].min(axis=1)
+    return games
+
+
+def synthetic_teams(games: pd.DataFrame) -> pd.DataFrame:
+    # games.csv has no matching teams feed, so name every id it uses
+    num_teams = int(games[["team_1_id", "team_2_id"]].max().max())
+    return pd.DataFrame({
+        "team_id": np.arange(1, num_teams + 1),
+        "team_name": [f" Team_{i} " for i in range(1, num_teams + 1)],
+    })
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    csv_path = ROOT / "games.csv"
+    raw_teams = synthetic_teams(pd.read_csv(csv_path))
+
+    def legacy():
+        games = legacy_prepare_games(pd.read_csv(csv_path))
+        teams = raw_teams.copy()
+        teams["team_name"] = teams["team_name"].apply(str.strip)
+        return legacy_merge_games(games, teams)
+
+    def vectorized():
+        games = prepare_games(pd.read_csv(csv_path, dtype=GAMES_DTYPES))
+        return merge_games(games, prepare_teams(raw_teams))
+
+    legacy_seconds = best_of(legacy, args.repeat)
+    vectorized_seconds = best_of(vectorized, args.repeat)
+    num_games = len(vectorized())
+
+    print(f"games.csv: {num_games} games, best of {args.repeat}")
+    print(f"  legacy      {legacy_seconds * 1e3:8.1f} ms")
+    print(f"  vectorized  {vectorized_seconds * 1e3:8.1f} ms")
+    print(f"  speedup     {legacy_seconds / vectorized_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
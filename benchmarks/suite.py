@@ -0,0 +1,249 @@
+"""
+Time every stage of the app (ingestion, Colley and Massey ratings, bracket
+parsing, bracket play, Monte Carlo simulation) on the repo's games.csv and
+bracket.csv and on scaled synthetic seasons. Runs fully offline.
+
+    python benchmarks/suite.py [--scales 4 16] [--repeat N]
+        [--output results.json] [--baseline baseline.json]
+        [--threshold 0.25] [--update-baseline]
+
+Results are written as JSON. The first run on a machine, with no baseline
+file yet, stores its results as the baseline. Later runs compare every
+stage against it and exit with status 1 if any stage is slower than the
+baseline by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Nothing below may touch the network
+os.environ["MARCH_MADNESS_OFFLINE"] = "1"
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bracket import parse_bracket_html  # noqa: E402
+from data import (  # noqa: E402
+    GAMES_DTYPES, compact_games, prepare_games, prepare_teams)
+from ingestion import synthetic_teams  # noqa: E402
+from ranker import ColleyRanker, MasseyRanker, RankingOptions  # noqa: E402
+from registry import TeamRegistry  # noqa: E402
+from simulation import fit_rating_scale, simulate_tournament  # noqa: E402
+from synthetic import generate_season, render_bracket_html  # noqa: E402
+from tournament import Tournament  # noqa: E402
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+DEFAULT_OUTPUT = BENCHMARK_DIR / "results.json"
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+
+# A stage is a regression when it is this much slower than the baseline
+DEFAULT_THRESHOLD = 0.25
+
+NUM_SIMS = 100_000
+
+
+def with_bracket_names(
+        teams: pd.DataFrame,
+        tournament: Tournament
+) -> pd.DataFrame:
+    # Give the field's names to the first teams so the bracket resolves
+    teams = teams.copy()
+    names = teams["team_name"].to_numpy(dtype=object)
+    names[:tournament.num_teams] = tournament.teams
+    teams["team_name"] = names
+    return teams
+
+
+def measure(fn, repeat: int) -> dict:
+    """
+    Best and median wall time over `repeat` runs, then the peak traced
+    memory of one more run (tracing slows it down, so it is not timed).
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": min(times),
+        "median_seconds": statistics.median(times),
+        "peak_memory_bytes": peak,
+    }
+
+
+def run_dataset(
+        label: str,
+        raw_games: pd.DataFrame,
+        raw_teams: pd.DataFrame,
+        page: str,
+        repeat: int,
+        bracket_stages: bool = True
+) -> dict[str, dict]:
+    results = {}
+
+    def record(stage: str, fn, items: int, unit: str):
+        result = measure(fn, repeat)
+        result["items"] = items
+        result["throughput"] = items / result["seconds"]
+        result["throughput_unit"] = unit
+        results[f"{label}/{stage}"] = result
+
+    bracket = parse_bracket_html(page)
+    tournament = Tournament(bracket)
+    raw_teams = with_bracket_names(raw_teams, tournament)
+
+    def ingest():
+        return compact_games(
+            prepare_games(raw_games), prepare_teams(raw_teams))
+
+    games = ingest()
+    teams = prepare_teams(raw_teams)
+    registry = TeamRegistry(teams)
+    options = RankingOptions(segment_weights=[0.5, 1, 1.5])
+    num_games = len(games)
+
+    record("ingestion", ingest, num_games, "games/s")
+    for name, ranker_class in (
+            ("colley", ColleyRanker), ("massey", MasseyRanker)):
+        record(
+            f"{name}_process",
+            lambda: ranker_class(
+                games, teams, options, registry=registry).process(),
+            num_games,
+            "games/s"
+        )
+    if not bracket_stages:
+        return results
+
+    # The field is 68 teams at every scale, so these run once
+    ranker = ColleyRanker(games, teams, options, registry=registry)
+    rankings = ranker.process()
+    ratings = ranker.solve(ranker.game_weights())
+    tournament = Tournament(bracket, registry)
+
+    def play():
+        return tournament.to_frame(*tournament.play(
+            tournament.team_ratings(rankings)))
+
+    record("bracket_parse", lambda: parse_bracket_html(page), 1, "pages/s")
+    record("bracket_play", play, 1, "brackets/s")
+
+    field_ratings = tournament.team_ratings(ratings)
+    scale = fit_rating_scale(ratings, ranker.winner_index, ranker.loser_index)
+    record(
+        "simulation",
+        lambda: simulate_tournament(
+            tournament, field_ratings, scale, num_sims=NUM_SIMS, seed=0),
+        NUM_SIMS,
+        "sims/s"
+    )
+    return results
+
+
+def compare(
+        results: dict[str, dict],
+        baseline: dict[str, dict],
+        threshold: float
+) -> list[str]:
+    regressions = []
+    print(f"\n{'stage':34} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        before = baseline[stage]["seconds"]
+        ratio = result["seconds"] / before
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(stage)
+            flag = "  REGRESSION"
+        print(
+            f"{stage:34} {before * 1e3:8.1f}ms "
+            f"{result['seconds'] * 1e3:8.1f}ms {ratio:6.2f}x{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--scales", type=int, nargs="*", default=[4],
+        help="synthetic seasons with this many times the teams and games")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--update-baseline", action="store_true",
+        help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    raw_games = pd.read_csv(ROOT / "games.csv", dtype=GAMES_DTYPES)
+    raw_teams = synthetic_teams(raw_games)
+    page = render_bracket_html(pd.read_csv(ROOT / "bracket.csv"))
+
+    datasets = [("games.csv", raw_games, raw_teams)]
+    for scale in args.scales:
+        season = generate_season(
+            num_teams=scale * len(raw_teams),
+            games_per_team=2 * len(raw_games) / len(raw_teams),
+            seed=scale
+        )
+        datasets.append((f"synthetic_x{scale}", season.games, season.teams))
+
+    results = {}
+    for i, (label, games, teams) in enumerate(datasets):
+        results.update(run_dataset(
+            label, games, teams, page, args.repeat, bracket_stages=i == 0))
+
+    print(f"{'stage':34} {'best':>10} {'peak mem':>10}  throughput")
+    for stage, result in results.items():
+        print(
+            f"{stage:34} {result['seconds'] * 1e3:8.1f}ms "
+            f"{result['peak_memory_bytes'] / 2**20:8.1f}MB  "
+            f"{result['throughput']:,.0f} {result['throughput_unit']}"
+        )
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2))
+
+    # Timings only compare on the machine that made them, so the baseline
+    # is not committed: the first run here becomes it
+    if args.update_baseline or not args.baseline.exists():
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    baseline = json.loads(args.baseline.read_text())["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(
+            f"\n{len(regressions)} stage(s) more than "
+            f"{args.threshold:.0%} slower than the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
-import streamlit as st
-import requests
-from bs4 import BeautifulSoup
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+import shared
+import snapshot
+from cache import cache_data
+from instrumentation import cached, span, traced
 
 BRACKET_URL = "https://www.ncaa.com/brackets/basketball-men/d1/2023"
 BRACKET_URL_2022 = "https://www.ncaa.com/brackets/basketball-men/d1/2022"
+BRACKET_URL_TEMPLATE = "https://www.ncaa.com/brackets/basketball-men/d1/{year}"
 
 
 PLAY_IN_SEED_MAP = {
@@ -13,11 +18,126 @@ PLAY_IN_SEED_MAP = {
     "6": "11"
 }
 
+# Raw bracket pages are kept here. A past year's page never changes; the
+# current season's (BRACKET_URL) is fetched again once its copy is older
+# than BRACKET_TTL_SECONDS, since the First Four fills in after Selection
+# Sunday.
+BRACKET_CACHE_DIR = snapshot.SNAPSHOT_DIR / "brackets"
+BRACKET_TTL_SECONDS = snapshot.SNAPSHOT_TTL_SECONDS
 
-@st.cache_data
-def get_bracket_games(url=BRACKET_URL, save_to_file=False):
-    r = requests.get(url)
-    soup = BeautifulSoup(r.text, "html.parser")
+# Only these parts of the page are parsed; everything else is skipped
+BRACKET_SECTIONS = ["region", "final-four", "first-four"]
+
+BRACKET_COLUMNS = [
+    "id",
+    "region_name",
+    "round",
+    "round_game_number",
+    "team_1_seed",
+    "team_1_name",
+    "team_1_win",
+    "team_2_seed",
+    "team_2_name",
+    "team_2_win"
+]
+
+_session = None
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        # requests is only imported once a page actually has to be fetched
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def _cache_path(url: str):
+    last_segment = url.rstrip("/").rsplit("/", 1)[-1]
+    name = last_segment if last_segment.isdigit() \
+        else hashlib.sha256(url.encode()).hexdigest()[:16]
+    return BRACKET_CACHE_DIR / f"{name}.html"
+
+
+def fetch_bracket_html(
+        url: str = BRACKET_URL,
+        refresh: bool = False,
+        ttl: float = None
+) -> str:
+    """
+    The bracket page at `url`, through its copy in BRACKET_CACHE_DIR. A
+    copy older than `ttl` seconds (BRACKET_TTL_SECONDS for BRACKET_URL,
+    forever for past years) or `refresh` fetches the page again. When
+    offline, or when the site cannot be reached, the saved copy is served.
+    """
+    if ttl is None:
+        ttl = BRACKET_TTL_SECONDS if url == BRACKET_URL else float("inf")
+    path = _cache_path(url)
+    with span("fetch_bracket_html", url=url) as s:
+        if path.exists() and (snapshot.OFFLINE or not refresh and (
+                time.time() - path.stat().st_mtime < ttl)):
+            s.cache = "hit"
+            return path.read_text(encoding="utf-8")
+        if snapshot.OFFLINE:
+            raise snapshot.SnapshotUnavailable(
+                f"No cached bracket page for {url} and offline mode is on")
+
+        import requests
+
+        s.cache = "miss"
+        try:
+            r = _get_session().get(
+                url, timeout=snapshot.REQUEST_TIMEOUT_SECONDS)
+            r.raise_for_status()
+        except requests.RequestException:
+            if path.exists():
+                return path.read_text(encoding="utf-8")
+            raise
+
+        BRACKET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        snapshot._write_atomic(path, r.text.encode("utf-8"))
+        return r.text
+
+
+def fetch_brackets(
+        urls: list[str],
+        refresh: bool = False,
+        max_workers: int = 4
+) -> dict[str, str]:
+    """
+    Fetch several bracket pages at once over the shared session.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pages = pool.map(lambda url: fetch_bracket_html(url, refresh), urls)
+        return dict(zip(urls, pages))
+
+
+def _team_fields(team) -> tuple[str, str]:
+    return (
+        team.find("span", {"class": "overline"}).text,
+        team.find("p", {"class": "body"}).text,
+    )
+
+
+@traced()
+def parse_bracket_html(html: str) -> pd.DataFrame:
+    """
+    Build the bracket frame from an NCAA bracket page, without network
+    access.
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    soup = BeautifulSoup(
+        html,
+        "html.parser",
+        parse_only=SoupStrainer("div", class_=BRACKET_SECTIONS)
+    )
 
     regions = soup.find_all("div", {"class": "region"})
 
@@ -25,58 +145,45 @@ def get_bracket_games(url=BRACKET_URL, save_to_file=False):
     regions = [region for region in regions
                if region.find("div", {"class": "region-round round-1"})]
 
-    df = pd.DataFrame(columns=[
-        "id",
-        "region_name",
-        "round",
-        "round_game_number",
-        "team_1_seed",
-        "team_1_name",
-        "team_1_win",
-        "team_2_seed",
-        "team_2_name",
-        "team_2_win"
-    ])
-    ind = 0
+    rows = []
     for region in regions:
         region_name = region.find("span", {"class": "subtitle"}).text
         for i in range(1, 5):
-            game_counter = 1
             round_div = region.find("div", {"class": f"region-round round-{i}"})
             if not round_div:
                 continue
             games = round_div.find_all("a", {"class": "game-pod"})
-            for game in games:
+            for game_counter, game in enumerate(games, start=1):
                 teams = game.find_all("div", {"class": "team"})
-                df.loc[ind] = [
+                (seed_1, name_1), (seed_2, name_2) = \
+                    _team_fields(teams[0]), _team_fields(teams[1])
+                row = [
                     int(game["id"]),
                     region_name,
                     i,
                     game_counter,
-                    int(teams[0].find("span", {"class": "overline"}).text) if len(teams[0].find("span", {"class": "overline"}).text) > 0 else None,
-                    teams[0].find("p", {"class": "body"}).text if len(teams[0].find("p", {"class": "body"}).text) > 0 else None,
+                    int(seed_1) if len(seed_1) > 0 else None,
+                    name_1 if len(name_1) > 0 else None,
                     None,
-                    int(teams[1].find("span", {"class": "overline"}).text) if len(teams[1].find("span", {"class": "overline"}).text) > 0 else None,
-                    teams[1].find("p", {"class": "body"}).text if len(teams[1].find("p", {"class": "body"}).text) > 0 else None,
+                    int(seed_2) if len(seed_2) > 0 else None,
+                    name_2 if len(name_2) > 0 else None,
                     None
                 ]
 
-                if len(teams[0].find("span", {"class": "overline"}).text) > 0 and not teams[0].find("span", {"class": "overline"}).text.isnumeric():
-                    df.loc[ind, "team_2_seed"] = int(PLAY_IN_SEED_MAP[str(df.loc[ind, "team_1_seed"])])
-                    df.loc[ind, "team_2_name"] = str(np.random.randint(1, 10))
+                if len(seed_1) > 0 and not seed_1.isnumeric():
+                    row[7] = int(PLAY_IN_SEED_MAP[str(row[4])])
+                    row[8] = str(np.random.randint(1, 10))
 
-                game_counter += 1
-                ind += 1
+                rows.append(row)
 
+    df = pd.DataFrame(rows, columns=BRACKET_COLUMNS, dtype=object)\
+        .astype({"id": int, "round": int, "round_game_number": int})
 
     # Modifications to include next game info
     df.loc[:, "next_round"] = df["round"] + 1
-    df.loc[:, "next_game_number"] = df.loc[:, "round_game_number"].apply(
-        lambda x: int(np.ceil(x / 2))
-    )
+    df.loc[:, "next_game_number"] = \
+        ((df["round_game_number"] + 1) // 2).astype(int)
     cols_to_keep = df.columns
-    df.sort_values(by=["round", "region_name", "round_game_number"])
-    df.reset_index(inplace=True, drop=True)
     copy = df.copy()
     copy.reset_index(inplace=True)
     df = df.merge(
@@ -92,29 +199,36 @@ def get_bracket_games(url=BRACKET_URL, save_to_file=False):
         "index": "next_game_index"
     }, inplace=True)
     df["next_game_id"] = df["next_game_id"].astype("Int64")
-    # df["next_game_index"] = df["next_game_index"].astype("Int64")
 
     final_four_games = soup.find("div", {"class": "final-four"})\
         .find_all("a", {"class": "game-pod"})
-    ff = pd.DataFrame(columns=df.columns)
+    ff_rows = []
     for raw_game in final_four_games:
-        teams = raw_game.find_all("div", {"class": "team"})
-        ff.loc[len(ff)] = [
-            int(raw_game["id"]),
-            "FINAL FOUR" if raw_game["id"][0] == "6" else "CHAMPIONSHIP",
-            int(str(raw_game["id"][0])) - 1,
-            int(str(raw_game["id"][-1])),
+        game_id = raw_game["id"]
+        is_semifinal = game_id[0] == "6"
+        ff_rows.append([
+            int(game_id),
+            "FINAL FOUR" if is_semifinal else "CHAMPIONSHIP",
+            int(game_id[0]) - 1,
+            int(game_id[-1]),
             None,
             None,
             None,
             None,
             None,
             None,
-            6 if raw_game["id"][0] == "6" else None,
-            1 if raw_game["id"][0] == "6" else None,
-            62 if raw_game["id"][0] == "6" else np.nan,
-            701 if raw_game["id"][0] == "6" else None,
-        ]
+            6 if is_semifinal else None,
+            1 if is_semifinal else None,
+            62 if is_semifinal else np.nan,
+            701 if is_semifinal else None,
+        ])
+    ff = pd.DataFrame(ff_rows, columns=df.columns, dtype=object)\
+        .astype({
+            "id": int,
+            "round": int,
+            "round_game_number": int,
+            "next_game_index": float
+        })
     ff.sort_values(by="id", inplace=True)
     ff.reset_index(inplace=True, drop=True)
 
@@ -129,7 +243,6 @@ def get_bracket_games(url=BRACKET_URL, save_to_file=False):
         ["next_game_number", "next_game_index", "next_game_id"]
     ] = [2, np.float64(61.0), 602]
 
-
     # First Four
     REGION_INDICATOR_MAP = {
         "S": "South",
@@ -152,13 +265,58 @@ def get_bracket_games(url=BRACKET_URL, save_to_file=False):
             ["team_2_seed", "team_2_name"]
         ] = [seed, teams]
 
+    return df
+
+
+def trim_bracket_html(html: str) -> str:
+    """
+    Only the parts of a bracket page that parse_bracket_html reads, as
+    markup. Small enough to keep a real page as a test fixture.
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    return str(BeautifulSoup(
+        html,
+        "html.parser",
+        parse_only=SoupStrainer("div", class_=BRACKET_SECTIONS)
+    ))
+
+
+def get_bracket_games(url=BRACKET_URL, save_to_file=False):
+    published = shared.load_published()
+    if published is not None and published.bracket is not None \
+            and url == BRACKET_URL and not save_to_file:
+        return published.bracket
+    return _parse_bracket_games(url, save_to_file)
+
+
+@cached(cache_data, name="get_bracket_games")
+def _parse_bracket_games(url, save_to_file):
+    df = parse_bracket_html(fetch_bracket_html(url))
+
     if save_to_file:
         df.to_csv("bracket.csv", index=False)
     return df
 
 
-@st.cache_data
+def get_brackets(urls: list[str]) -> dict[str, pd.DataFrame]:
+    """
+    Bracket frames for several years, with the pages fetched concurrently.
+    """
+    return {
+        url: parse_bracket_html(html)
+        for url, html in fetch_brackets(urls).items()
+    }
+
+
 def get_team_seeds():
+    # Recomputed when a new season is published
+    published = shared.load_published()
+    return _team_seeds(None if published is None else published.version)
+
+
+@cached(cache_data, name="get_team_seeds")
+def _team_seeds(published_version):
     bracket_games = get_bracket_games()
     bracket_games = bracket_games[bracket_games["round"] == 1]
     df = pd.concat([
@@ -184,4 +342,15 @@ def get_team_seeds():
 
 
 if __name__ == "__main__":
-    get_bracket_games(save_to_file=True)
+    import sys
+
+    if sys.argv[1:2] == ["fixture"]:
+        # python bracket.py fixture 2023: keep that year's page, trimmed,
+        # for tests/test_bracket.py
+        year = int(sys.argv[2])
+        html = fetch_bracket_html(BRACKET_URL_TEMPLATE.format(year=year))
+        with open(f"tests/fixtures/ncaa_bracket_{year}.html", "w",
+                  encoding="utf-8") as f:
+            f.write(trim_bracket_html(html))
+    else:
+        get_bracket_games(save_to_file=True)
@@ -0,0 +1,148 @@
+"""
+Function caching that works with or without Streamlit.
+
+`cache_data` and `cache_resource` are drop-in replacements for the
+Streamlit decorators. The backend is chosen on first call, not at import,
+so library code never imports streamlit itself:
+
+- "streamlit": st.cache_data / st.cache_resource (inside the app)
+- "memory": an in-process dict keyed on the arguments
+- "none": no caching
+
+The default, "auto", uses Streamlit when it has already been imported (the
+app) and memory otherwise. Override with MARCH_MADNESS_CACHE or
+set_backend().
+"""
+import collections
+import copy
+import functools
+import hashlib
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+BACKENDS = ("auto", "streamlit", "memory", "none")
+
+_backend = os.environ.get("MARCH_MADNESS_CACHE", "auto")
+
+# Every cached function, so clear_all() can reach them
+_functions = []
+
+
+def set_backend(name: str):
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"cache backend must be one of {BACKENDS}, not {name!r}")
+    _backend = name
+
+
+def get_backend() -> str:
+    if _backend == "auto":
+        return "streamlit" if "streamlit" in sys.modules else "memory"
+    return _backend
+
+
+def _argument_key(value) -> bytes:
+    # Stable bytes for anything the app passes to a cached function,
+    # including DataFrames and arrays, which are not hashable
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        hashed = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        columns = list(value.columns) if isinstance(value, pd.DataFrame) \
+            else [value.name]
+        return b"pd" + hashed.tobytes() + repr(columns).encode()
+    if isinstance(value, np.ndarray):
+        return b"np" + repr((value.dtype, value.shape)).encode() \
+            + value.tobytes()
+    try:
+        return b"pk" + pickle.dumps(value)
+    except Exception:
+        return b"id" + repr(id(value)).encode()
+
+
+def _memory_cache(fn, copy_results: bool, max_entries: int = None):
+    # Least recently used entries go first once there are max_entries
+    results = collections.OrderedDict()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        digest = hashlib.sha1()
+        for value in args + tuple(sorted(kwargs.items())):
+            digest.update(_argument_key(value))
+        key = digest.hexdigest()
+
+        if key in results:
+            results.move_to_end(key)
+        else:
+            results[key] = fn(*args, **kwargs)
+            if max_entries is not None and len(results) > max_entries:
+                results.popitem(last=False)
+        # Like st.cache_data, callers get their own copy of data results
+        return copy.deepcopy(results[key]) if copy_results \
+            else results[key]
+
+    wrapper.clear = results.clear
+    return wrapper
+
+
+class _CachedFunction:
+    def __init__(self, fn, kind: str, max_entries: int = None):
+        functools.update_wrapper(self, fn)
+        self.fn = fn
+        self.kind = kind
+        self.max_entries = max_entries
+        self._backend = None
+        self._impl = None
+        _functions.append(self)
+
+    def _resolve(self):
+        backend = get_backend()
+        if backend != self._backend:
+            if backend == "streamlit":
+                import streamlit as st
+                decorator = st.cache_data if self.kind == "data" \
+                    else st.cache_resource
+                self._impl = decorator(self.fn, max_entries=self.max_entries)
+            elif backend == "memory":
+                self._impl = _memory_cache(
+                    self.fn, copy_results=self.kind == "data",
+                    max_entries=self.max_entries)
+            else:
+                self._impl = self.fn
+            self._backend = backend
+        return self._impl
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def clear(self):
+        if self._impl is not None and hasattr(self._impl, "clear"):
+            self._impl.clear()
+
+
+def cache_data(fn=None, *, max_entries: int = None):
+    """
+    Cache a function returning data; each caller gets its own copy. Like
+    st.cache_data, `max_entries` bounds the cache and
+    cache_data(max_entries=n) returns the decorator.
+    """
+    if fn is None:
+        return functools.partial(cache_data, max_entries=max_entries)
+    return _CachedFunction(fn, "data", max_entries)
+
+
+def cache_resource(fn=None, *, max_entries: int = None):
+    """
+    Cache a function returning a shared, read-only object (`max_entries`
+    as for cache_data).
+    """
+    if fn is None:
+        return functools.partial(cache_resource, max_entries=max_entries)
+    return _CachedFunction(fn, "resource", max_entries)
+
+
+def clear_all():
+    for fn in _functions:
+        fn.clear()
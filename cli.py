@@ -0,0 +1,166 @@
+"""
+Ingest, rate and play the bracket from the command line, without Streamlit.
+
+    python cli.py ingest --output games.csv
+    python cli.py rate --method Massey --home 0.8 --segments 0.5 1 1.5 \\
+        --output ratings.json
+    python cli.py bracket --method Colley --output bracket.csv
+    python cli.py rate --method Colley --half-life 0.3
+    python cli.py trajectory --method Massey --teams Houston UConn
+
+Output is JSON for a .json path and CSV otherwise ("-" for stdout).
+"""
+import argparse
+import os
+import sys
+
+# Only argparse is imported up front so that --help and argument errors
+# return immediately; each command imports what it needs.
+
+
+def _write(df, output: str):
+    if output == "-":
+        df.to_csv(sys.stdout, index=False)
+    elif output.endswith(".json"):
+        df.to_json(output, orient="records", indent=2, date_format="iso")
+    else:
+        df.to_csv(output, index=False)
+
+
+def _load(season: int):
+    from data import TEAM_NAME_MAPPINGS, load_season
+    from registry import TeamRegistry
+
+    games, teams = load_season(season)
+    return games, teams, TeamRegistry(teams, aliases=TEAM_NAME_MAPPINGS)
+
+
+def _ranker(args):
+    from decay import Breakpoints, ExponentialDecay, LinearRamp
+    from ranker import RANKERS, RankingOptions
+
+    if args.method not in RANKERS:
+        sys.exit(f"unknown method {args.method!r}; choose from "
+                 f"{', '.join(RANKERS)}")
+
+    games, teams, registry = _load(args.season)
+    time_decay = None
+    if args.half_life is not None:
+        time_decay = ExponentialDecay(args.half_life)
+    elif args.ramp is not None:
+        time_decay = LinearRamp(args.ramp, 1)
+    elif args.breakpoints is not None:
+        points = [point.split(":") for point in args.breakpoints]
+        time_decay = Breakpoints(
+            [float(f) for f, _ in points], [float(w) for _, w in points])
+
+    options = RankingOptions(
+        weight_home_win=args.home,
+        weight_away_win=args.away,
+        weight_neutral_win=args.neutral,
+        use_time_weights=len(args.segments) > 1 or time_decay is not None,
+        segment_weights=args.segments,
+        time_decay=time_decay,
+    )
+    ranker = RANKERS[args.method](games, teams, options, registry=registry)
+    return ranker, registry
+
+
+def _rate(args):
+    ranker, registry = _ranker(args)
+    return ranker.process(), registry
+
+
+def ingest(args):
+    from data import expand_games
+
+    games, teams, _ = _load(args.season)
+    _write(expand_games(games, teams), args.output)
+
+
+def rate(args):
+    result, registry = _rate(args)
+    ratings = result.to_frame()
+    ratings.insert(2, "team_id", registry.ids[result.order])
+    _write(ratings, args.output)
+
+
+def trajectory(args):
+    ranker, _ = _ranker(args)
+    ratings = ranker.trajectory().to_frame(args.teams)
+    _write(ratings.reset_index(), args.output)
+
+
+def bracket(args):
+    from bracket import BRACKET_URL_TEMPLATE, fetch_bracket_html, \
+        parse_bracket_html
+    from tournament import Tournament
+
+    result, registry = _rate(args)
+    if args.bracket_html:
+        with open(args.bracket_html, encoding="utf-8") as f:
+            html = f.read()
+    else:
+        html = fetch_bracket_html(BRACKET_URL_TEMPLATE.format(year=args.season))
+
+    tournament = Tournament(parse_bracket_html(html), registry)
+    slots, winner_spot = tournament.play(tournament.team_ratings(result))
+    _write(tournament.to_frame(slots, winner_spot), args.output)
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--offline", action="store_true",
+        help="only use local snapshots and cached bracket pages")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name: str, fn, help: str, rating: bool = True):
+        sub = commands.add_parser(name, help=help)
+        sub.set_defaults(run=fn)
+        sub.add_argument(
+            "--season", type=int, help="tournament year (default: current)")
+        sub.add_argument("--output", default="-")
+        if rating:
+            sub.add_argument(
+                "--method", default="Colley",
+                help="a ranking method in ranker.RANKERS (default: Colley)")
+            sub.add_argument("--home", type=float, default=1)
+            sub.add_argument("--away", type=float, default=1)
+            sub.add_argument("--neutral", type=float, default=1)
+            time = sub.add_mutually_exclusive_group()
+            time.add_argument(
+                "--segments", type=float, nargs="+", default=[1],
+                help="time segment weights, earliest first")
+            time.add_argument(
+                "--half-life", type=float,
+                help="exponential time decay, in fractions of the season")
+            time.add_argument(
+                "--ramp", type=float, metavar="START",
+                help="weight rising linearly from START to 1 over the season")
+            time.add_argument(
+                "--breakpoints", nargs="+", metavar="FRACTION:WEIGHT",
+                help="weights at points in the season, interpolated")
+        return sub
+
+    command("ingest", ingest, "write the merged games table", rating=False)
+    command("rate", rate, "write team ratings")
+    command("bracket", bracket, "write the predicted bracket").add_argument(
+        "--bracket-html", help="bracket page saved locally")
+    command(
+        "trajectory", trajectory,
+        "write every team's rating as of each day of the season"
+    ).add_argument("--teams", nargs="+", help="only these teams")
+
+    args = parser.parse_args(argv)
+    if args.offline:
+        # Read when snapshot is first imported
+        os.environ["MARCH_MADNESS_OFFLINE"] = "1"
+    if args.season is None:
+        from data import CURRENT_SEASON
+        args.season = CURRENT_SEASON
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
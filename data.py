@@ -1,8 +1,12 @@
-import streamlit as st
+import hashlib
 import pandas as pd
-from datetime import datetime as dt
-import pytz
+import numpy as np
 import re
+from cache import cache_data, cache_resource
+from instrumentation import cached
+from registry import TeamRegistry
+from shared import load_published
+from snapshot import load_feed
 
 # Disable flake8 warning about line length
 TEAMS_ENDPOINT = "https://masseyratings.com/scores.php\
@@ -10,28 +14,76 @@ TEAMS_ENDPOINT = "https://masseyratings.com/scores.php\
 GAMES_ENDPOINT = "https://masseyratings.com/scores.php\
 ?s=500054&sub=11590&all=1&mode=3&format=1"
 
+# Massey season ids ("s=" in the feed URLs) by tournament year. Seasons
+# without a known id can still be loaded from a local snapshot named
+# "teams_<year>" / "games_<year>".
+CURRENT_SEASON = 2023
+MASSEY_SEASON_IDS = {
+    2023: 500054,
+}
+MASSEY_FEED_URL = "https://masseyratings.com/scores.php\
+?s={season_id}&sub=11590&all=1&mode=3&format={format}"
+
+TIMEZONE = "US/Eastern"
+
+# Massey's days_since_timestart is the proleptic ordinal plus 365
+MASSEY_DAY_OFFSET = 365
+UNIX_EPOCH_ORDINAL = 719163
+
+# Column dtypes of the raw Massey feeds
+TEAMS_DTYPES = {
+    "team_id": "int32",
+    "team_name": "object",
+}
+GAMES_DTYPES = {
+    "days_since_timestart": "int32",
+    "date": "int32",
+    "team_1_id": "int32",
+    "team_1_homefield": "int8",
+    "team_1_score": "int16",
+    "team_2_id": "int32",
+    "team_2_homefield": "int8",
+    "team_2_score": "int16",
+}
+
+# What get_data keeps per game: teams are rows of the teams table (the
+# TeamRegistry index), and names, dates and results are derived on demand
+# (game_dates, expand_games). Team indices widen to int32 for leagues with
+# more teams than int16 can index.
+COMPACT_GAMES_DTYPES = {
+    "days_since_timestart": "int32",
+    "team_1_index": "int16",
+    "team_1_homefield": "int8",
+    "team_1_score": "int16",
+    "team_2_index": "int16",
+    "team_2_homefield": "int8",
+    "team_2_score": "int16",
+}
+
+
+# Massey spellings (after underscore/"St" cleanup) -> NCAA bracket names
+TEAM_NAME_MAPPINGS = {
+    "Miami OH": "Miami (OH)",
+    "Miami FL": "Miami (FL)",
+    "Loyola-Chicago": "Loyola Chicago",
+    "St Mary's CA": "Saint Mary's",
+    "St Peter's": "Saint Peter's",
+    "S Dakota St.": "South Dakota St.",
+    "TX Southern": "Texas Southern",
+    "Connecticut": "UConn",
+    "CS Fullerton": "Cal State Fullerton",
+    "Col Charleston": "Col of Charleston",
+    "FL Atlantic": "FAU",
+    "Kennesaw": "Kennesaw St.",
+    "Kent": "Kent St.",
+    "UC Santa Barbara": "UCSB",
+    "TAM C. Christi": "Texas A&M-CC",
+    "F Dickinson": "F. Dickinson",
+    "Pittsburgh": "Pitt",
+}
 
-def format_team_name(team_name: str) -> str:
-    TEAM_NAME_MAPPINGS = {
-        "Miami OH": "Miami (OH)",
-        "Miami FL": "Miami (FL)",
-        "Loyola-Chicago": "Loyola Chicago",
-        "St Mary's CA": "Saint Mary's",
-        "St Peter's": "Saint Peter's",
-        "S Dakota St.": "South Dakota St.",
-        "TX Southern": "Texas Southern",
-        "Connecticut": "UConn",
-        "CS Fullerton": "Cal State Fullerton",
-        "Col Charleston": "Col of Charleston",
-        "FL Atlantic": "FAU",
-        "Kennesaw": "Kennesaw St.",
-        "Kent": "Kent St.",
-        "UC Santa Barbara": "UCSB",
-        "TAM C. Christi": "Texas A&M-CC",
-        "F Dickinson": "F. Dickinson",
-        "Pittsburgh": "Pitt",
-    }
 
+def format_team_name(team_name: str) -> str:
     team_name = team_name.strip()
 
     team_name = team_name.replace("_", " ")
@@ -46,100 +98,80 @@ def format_team_name(team_name: str) -> str:
     return team_name
 
 
-@st.cache_data
+def prepare_teams(teams_df: pd.DataFrame) -> pd.DataFrame:
+    teams_df = teams_df.astype(TEAMS_DTYPES)
+    teams_df["raw_team_name"] = teams_df["team_name"].str.strip()
+    teams_df["team_name"] = teams_df["team_name"].map(format_team_name)
+    return teams_df
+
+
 def get_teams() -> pd.DataFrame:
+    published = load_published()
+    if published is not None:
+        return published.teams
+    return _snapshot_teams()
 
-    teams_df = pd.read_csv(TEAMS_ENDPOINT, header=None, index_col=None)
-    teams_df.columns = ["team_id", "team_name"]
-    teams_df["team_id"] = teams_df["team_id"].astype(int)
-    teams_df["raw_team_name"] = teams_df["team_name"].copy()
-    teams_df["team_name"] = teams_df["team_name"].apply(format_team_name)
-    return teams_df
+
+@cached(cache_data, name="get_teams")
+def _snapshot_teams() -> pd.DataFrame:
+    return prepare_teams(load_feed(
+        "teams", TEAMS_ENDPOINT, list(TEAMS_DTYPES), TEAMS_DTYPES))
+
+
+def get_registry() -> TeamRegistry:
+    return _registry(get_data_version())
+
+
+@cached(cache_resource, name="get_registry")
+def _registry(data_version: str) -> TeamRegistry:
+    # Shared, not copied per caller: the registry is read-only once built
+    return TeamRegistry(get_teams(), aliases=TEAM_NAME_MAPPINGS)
 
 
 def get_team_by_id(team_id: int) -> str:
-    teams_df = get_teams()
-    return teams_df["team_name"][team_id - 1]
+    return get_registry().name(team_id)
 
 
 def get_team_id_by_name(team_name: str) -> int:
-    teams_df = get_teams()
-    return teams_df[teams_df["team_name"] == team_name]["team_id"].values[0]
+    return get_registry().team_id(team_name)
 
 
-@st.cache_data
-def get_games() -> pd.DataFrame:
-    games = pd.read_csv(GAMES_ENDPOINT, header=None, index_col=None)
-    games.columns = [
-        "days_since_timestart",
-        "date",
-        "team_1_id",
-        "team_1_homefield",
-        "team_1_score",
-        "team_2_id",
-        "team_2_homefield",
-        "team_2_score",
-    ]
-
-    # Make the homefield column a binary, instead of 1 and -1
-    games["team_1_homefield"] = games["team_1_homefield"].apply(
-        lambda x: 1 if x == 1 else 0
-    )
-    games["team_2_homefield"] = games["team_2_homefield"].apply(
-        lambda x: 1 if x == 1 else 0
-    )
-
-    # Convert the date column to a datetime object
-    games["date"] = games["date"].apply(
-        lambda x: dt.strptime(str(x), "%Y%m%d")
-        .astimezone(pytz.timezone("US/Eastern"))
-    )
+def prepare_games(games: pd.DataFrame) -> pd.DataFrame:
+    # Homefield stays as Massey codes it: 1 home, -1 away, 0 neutral
+    games = games.astype(GAMES_DTYPES)
+
+    # Convert the YYYYMMDD date column to midnight Eastern on that day
+    date = games["date"].to_numpy()
+    games["date"] = pd.to_datetime(pd.DataFrame({
+        "year": date // 10000,
+        "month": date // 100 % 100,
+        "day": date % 100,
+    })).dt.tz_localize(TIMEZONE)
 
     return games
 
 
-@st.cache_data
-def get_data() -> pd.DataFrame:
-    teams = get_teams()
-    games = get_games()
-
-    # Bring in two new columns team_1_name and team_2_name
-    #  by joining in the teams df twice
-    games = games.merge(
-        teams,
-        left_on="team_1_id",
-        right_on="team_id",
-        how="left"
-    )
-    games = games.merge(
-        teams,
-        left_on="team_2_id",
-        right_on="team_id",
-        how="left"
-    )
-
-    # Drop the extra team_id columns
-    games.drop(columns=["team_id_x", "team_id_y"], inplace=True)
-
-    # Rename the team_name columns
-    games.rename(
-        columns={"team_name_x": "team_1_name", "team_name_y": "team_2_name"},
-        inplace=True
-    )
-
-    # Trim any string whitespace from any string columns
-    games = games.applymap(
-        lambda x: x.strip() if isinstance(x, str) else x
-    )
-
-    games.loc[:, "team_1_win"] = games["team_1_score"] > games["team_2_score"]
-    games.loc[:, "team_2_win"] = games["team_2_score"] > games["team_1_score"]
-    games.loc[:, "winning_score"] = games[
-        ["team_1_score", "team_2_score"]
-    ].max(axis=1)
-    games.loc[:, "losing_score"] = games[
-        ["team_1_score", "team_2_score"]
-    ].min(axis=1)
+@cached(cache_data)
+def get_games() -> pd.DataFrame:
+    return prepare_games(load_feed(
+        "games", GAMES_ENDPOINT, list(GAMES_DTYPES), GAMES_DTYPES))
+
+
+def merge_games(games: pd.DataFrame, teams: pd.DataFrame) -> pd.DataFrame:
+    games = games.copy()
+
+    # Bring in two new columns team_1_name and team_2_name by looking the
+    #  ids up in the teams table; names were already trimmed there
+    team_names = teams.set_index("team_id")["team_name"]
+    games["team_1_name"] = games["team_1_id"].map(team_names)
+    games["team_2_name"] = games["team_2_id"].map(team_names)
+
+    team_1_score = games["team_1_score"].to_numpy()
+    team_2_score = games["team_2_score"].to_numpy()
+    games["team_1_win"] = team_1_score > team_2_score
+    games["team_2_win"] = team_2_score > team_1_score
+    games["winning_score"] = np.maximum(team_1_score, team_2_score)
+    games["losing_score"] = np.minimum(team_1_score, team_2_score)
 
     return games[[
         "days_since_timestart",
@@ -159,14 +191,137 @@ def get_data() -> pd.DataFrame:
     ]]
 
 
+def index_dtype(num_teams: int) -> str:
+    # Narrowest dtype that holds every registry index (simulation.py does the
+    # same for bracket slots)
+    return COMPACT_GAMES_DTYPES["team_1_index"] \
+        if num_teams <= 2**15 else "int32"
+
+
+def compact_games(games: pd.DataFrame, teams: pd.DataFrame) -> pd.DataFrame:
+    """
+    The games (prepare_games) with narrow dtypes and each team as its row
+    in `teams`, which is its TeamRegistry index. Names, dates and results
+    are left out; expand_games puts them back.
+    """
+    team_rows = pd.Index(teams["team_id"])
+    team_1_index = team_rows.get_indexer(games["team_1_id"])
+    team_2_index = team_rows.get_indexer(games["team_2_id"])
+    if (team_1_index < 0).any() or (team_2_index < 0).any():
+        unknown = set(games["team_1_id"][team_1_index < 0]) \
+            | set(games["team_2_id"][team_2_index < 0])
+        raise ValueError(f"Games with unknown team ids {sorted(unknown)}")
+
+    return pd.DataFrame({
+        "days_since_timestart": games["days_since_timestart"].to_numpy(),
+        "team_1_index": team_1_index,
+        "team_1_homefield": games["team_1_homefield"].to_numpy(),
+        "team_1_score": games["team_1_score"].to_numpy(),
+        "team_2_index": team_2_index,
+        "team_2_homefield": games["team_2_homefield"].to_numpy(),
+        "team_2_score": games["team_2_score"].to_numpy(),
+    }).astype({**COMPACT_GAMES_DTYPES, **dict.fromkeys(
+        ["team_1_index", "team_2_index"], index_dtype(len(teams)))})
+
+
+def game_dates(days) -> pd.DatetimeIndex:
+    # Midnight Eastern on each Massey day number, as prepare_games dates
+    days = np.asarray(days, dtype=np.int64)
+    return pd.DatetimeIndex(
+        (days - MASSEY_DAY_OFFSET - UNIX_EPOCH_ORDINAL).astype("datetime64[D]")
+    ).tz_localize(TIMEZONE)
+
+
+def expand_games(games: pd.DataFrame, teams: pd.DataFrame) -> pd.DataFrame:
+    """
+    The full games table (as merge_games) for compact games, e.g. for
+    display or export.
+    """
+    team_ids = teams["team_id"].to_numpy()
+    team_1_index = games["team_1_index"].to_numpy()
+    team_2_index = games["team_2_index"].to_numpy()
+
+    expanded = pd.DataFrame({
+        "days_since_timestart": games["days_since_timestart"].to_numpy(),
+        "date": game_dates(games["days_since_timestart"]),
+        "team_1_id": team_ids[team_1_index],
+        "team_1_homefield": games["team_1_homefield"].to_numpy(),
+        "team_1_score": games["team_1_score"].to_numpy(),
+        "team_2_id": team_ids[team_2_index],
+        "team_2_homefield": games["team_2_homefield"].to_numpy(),
+        "team_2_score": games["team_2_score"].to_numpy(),
+    }, index=games.index).astype({
+        "team_1_id": GAMES_DTYPES["team_1_id"],
+        "team_2_id": GAMES_DTYPES["team_2_id"],
+    })
+    return merge_games(expanded, teams)
+
+
+def get_data() -> pd.DataFrame:
+    """
+    The season's compact games: the published, memory-mapped copy shared
+    by every worker when there is one (read-only), otherwise this
+    process's own copy of the snapshot.
+    """
+    published = load_published()
+    if published is not None:
+        return published.games
+    return _snapshot_data()
+
+
+@cached(cache_data, name="get_data")
+def _snapshot_data() -> pd.DataFrame:
+    return compact_games(get_games(), _snapshot_teams())
+
+
+def frame_version(games: pd.DataFrame) -> str:
+    return hashlib.sha1(
+        pd.util.hash_pandas_object(games, index=False).to_numpy().tobytes()
+    ).hexdigest()
+
+
+def get_data_version() -> str:
+    # Identifies the games get_data is serving
+    published = load_published()
+    if published is not None:
+        return published.version
+    return _snapshot_version()
+
+
+@cached(cache_resource)
+def _snapshot_version() -> str:
+    return frame_version(_snapshot_data())
+
+
+def load_season(year: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compact games (as get_data) and teams for any season, read through the
+    local snapshots. Unlike get_data, nothing is cached between calls.
+    """
+    season_id = MASSEY_SEASON_IDS.get(year)
+    suffix = "" if year == CURRENT_SEASON else f"_{year}"
+
+    def url(format: int) -> str:
+        if season_id is None:
+            return None
+        return MASSEY_FEED_URL.format(season_id=season_id, format=format)
+
+    teams = prepare_teams(load_feed(
+        f"teams{suffix}", url(2), list(TEAMS_DTYPES), TEAMS_DTYPES))
+    games = prepare_games(load_feed(
+        f"games{suffix}", url(1), list(GAMES_DTYPES), GAMES_DTYPES))
+    return compact_games(games, teams), teams
+
+
 def get_games_by_team_id(team_id: int) -> pd.DataFrame:
     df = get_data()
-    return df[
-        (df["team_1_id"] == team_id) | (df["team_2_id"] == team_id)
-    ]
+    index = get_registry().index(team_id)
+    return expand_games(df[
+        (df["team_1_index"] == index) | (df["team_2_index"] == index)
+    ], get_teams())
 
 
 if __name__ == "__main__":
-    df = get_data()
+    df = expand_games(get_data(), get_teams())
     print(df.columns)
     print(df.head())
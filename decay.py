@@ -0,0 +1,91 @@
+"""
+Time weights for games, as a function of how far through the season each
+was played: season_fraction is 0 on the day before the first game and 1 on
+the last day of the season.
+
+Every schedule is an immutable, hashable callable mapping an array of
+season fractions to an array of weights, so it can be part of
+RankingOptions and of cache keys.
+
+    Segments((0.5, 1, 1.5))     # piecewise constant, equal-length segments
+    ExponentialDecay(0.25)      # weight halves every quarter season back
+    LinearRamp(0.5, 1)          # 0.5 at the start, rising to 1 at the end
+    Breakpoints((0, 0.5, 1), (0.2, 1, 1))   # linear between the points
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+def _floats(values) -> tuple[float, ...]:
+    return tuple(float(v) for v in np.atleast_1d(values))
+
+
+def segment_index(season_fraction: np.ndarray, num_segments: int) -> np.ndarray:
+    # Which of num_segments equal time segments each game falls in; games
+    # past the end of the season count in the last one.
+    return np.clip(
+        np.ceil(num_segments * season_fraction).astype(np.intp) - 1,
+        0, num_segments - 1)
+
+
+@dataclass(frozen=True)
+class Segments:
+    weights: tuple[float, ...] = (1.0,)
+
+    def __post_init__(self):
+        object.__setattr__(self, "weights", _floats(self.weights))
+
+    def __call__(self, season_fraction: np.ndarray) -> np.ndarray:
+        return np.array(self.weights)[
+            segment_index(season_fraction, len(self.weights))]
+
+
+@dataclass(frozen=True)
+class ExponentialDecay:
+    # In fractions of the season
+    half_life: float = 0.25
+
+    def __post_init__(self):
+        if self.half_life <= 0:
+            raise ValueError(
+                f"half_life must be positive, not {self.half_life}")
+        object.__setattr__(self, "half_life", float(self.half_life))
+
+    def __call__(self, season_fraction: np.ndarray) -> np.ndarray:
+        return 0.5 ** ((1 - np.minimum(season_fraction, 1)) / self.half_life)
+
+
+@dataclass(frozen=True)
+class LinearRamp:
+    start: float = 0.5
+    end: float = 1.0
+
+    def __post_init__(self):
+        object.__setattr__(self, "start", float(self.start))
+        object.__setattr__(self, "end", float(self.end))
+
+    def __call__(self, season_fraction: np.ndarray) -> np.ndarray:
+        return self.start + (self.end - self.start) \
+            * np.clip(season_fraction, 0, 1)
+
+
+@dataclass(frozen=True)
+class Breakpoints:
+    # Weights at increasing season fractions, interpolated linearly in
+    # between and held constant outside
+    fractions: tuple[float, ...]
+    weights: tuple[float, ...]
+
+    def __post_init__(self):
+        object.__setattr__(self, "fractions", _floats(self.fractions))
+        object.__setattr__(self, "weights", _floats(self.weights))
+        if len(self.fractions) != len(self.weights):
+            raise ValueError(
+                "Breakpoints needs one weight per fraction, not "
+                f"{len(self.weights)} for {len(self.fractions)}")
+        if np.any(np.diff(self.fractions) <= 0):
+            raise ValueError("Breakpoint fractions must be increasing")
+
+    def __call__(self, season_fraction: np.ndarray) -> np.ndarray:
+        return np.interp(season_fraction, self.fractions, self.weights)
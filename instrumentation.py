@@ -0,0 +1,243 @@
+"""
+Lightweight timing spans for the app pipeline.
+
+    with span("solve", teams=n):
+        ...
+
+    @traced("parse_bracket_html")
+    def parse_bracket_html(html): ...
+
+Spans record wall time, CPU time, peak traced allocation (when memory
+tracing is on) and, for functions wrapped with `cached`, whether the call
+was a cache hit. They are only recorded while instrumentation is enabled:
+globally (MARCH_MADNESS_INSTRUMENT=1, or enable()) or for the current
+thread inside a Trace. Otherwise a span is a shared no-op object.
+
+Finished top-level spans are logged as JSON lines (one per span,
+children included) on the "march_madness.spans" logger.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+logger = logging.getLogger("march_madness.spans")
+
+ENABLED = os.environ.get("MARCH_MADNESS_INSTRUMENT", "") not in ("", "0")
+
+_local = threading.local()
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def _active() -> bool:
+    return ENABLED or getattr(_local, "trace", None) is not None
+
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+class Span:
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.cache = None
+        self.children = []
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_bytes = None
+        # Highest traced memory seen by any finished child
+        self._child_peak = 0
+
+    def __enter__(self):
+        stack = _stack()
+        self.path = "/".join([s.name for s in stack] + [self.name])
+        stack.append(self)
+
+        self.started = time.time()
+        if tracemalloc.is_tracing():
+            self._start_memory, peak = tracemalloc.get_traced_memory()
+            if len(stack) > 1:
+                stack[-2]._child_peak = max(stack[-2]._child_peak, peak)
+            tracemalloc.reset_peak()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_seconds = time.perf_counter() - self._wall
+        self.cpu_seconds = time.process_time() - self._cpu
+
+        stack = _stack()
+        stack.pop()
+
+        if tracemalloc.is_tracing() and hasattr(self, "_start_memory"):
+            peak = max(tracemalloc.get_traced_memory()[1], self._child_peak)
+            self.peak_bytes = max(peak - self._start_memory, 0)
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+
+        if stack:
+            stack[-1].children.append(self)
+        else:
+            _finish(self)
+        return False
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> dict:
+        return {
+            "span": self.path,
+            "started": self.started,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_bytes": self.peak_bytes,
+            "cache": self.cache,
+            **self.attributes,
+        }
+
+
+class _NullSpan:
+    # Returned while disabled; attribute writes are accepted and dropped
+    cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attributes):
+    if not _active():
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def current_span():
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+def traced(name: str = None):
+    """
+    Decorator form of span(), named after the function by default.
+    """
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _active():
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def cached(cache, name: str = None):
+    """
+    Apply a caching decorator (e.g. st.cache_data) so that every call is a
+    span marked as a cache "hit", or a "miss" when the function body runs.
+
+        @cached(st.cache_data)
+        def get_data(): ...
+    """
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def compute(*args, **kwargs):
+            parent = current_span()
+            if parent is not None and parent.name == span_name:
+                parent.cache = "miss"
+            return fn(*args, **kwargs)
+
+        cached_fn = cache(compute)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _active():
+                return cached_fn(*args, **kwargs)
+            with Span(span_name, {}) as s:
+                s.cache = "hit"
+                return cached_fn(*args, **kwargs)
+
+        if hasattr(cached_fn, "clear"):
+            wrapper.clear = cached_fn.clear
+        return wrapper
+    return decorate
+
+
+def _finish(root: Span):
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.spans.append(root)
+    if logger.isEnabledFor(logging.INFO):
+        for s in root.walk():
+            logger.info(json.dumps(s.to_dict(), default=str))
+
+
+class Trace:
+    """
+    Records every span on the current thread until end(), whether or not
+    instrumentation is enabled globally.
+
+        trace = Trace(memory=True)
+        ...
+        trace.end()
+        trace.to_frame()
+    """
+
+    def __init__(self, memory: bool = False):
+        self.spans = []
+        self._started_tracemalloc = memory and not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        _local.trace = self
+
+    def end(self):
+        if getattr(_local, "trace", None) is self:
+            _local.trace = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+        return False
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame([
+            s.to_dict() for root in self.spans for s in root.walk()
+        ], columns=[
+            "span", "wall_seconds", "cpu_seconds", "peak_bytes", "cache"])
@@ -1,10 +1,10 @@
-import streamlit as st
 import numpy as np
 import pandas as pd
 from math import ceil
+from cache import cache_data
 
 
-@st.cache
+@cache_data
 def massey(games, teams, opts={
     "weight_home_win": 1,
     "weight_away_win": 1,
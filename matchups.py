@@ -0,0 +1,101 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from ranker import Ranker
+from simulation import fit_rating_scale, win_probabilities
+
+# Matchup matrices kept for the most recent ratings snapshots
+MATCHUP_CACHE_SIZE = 16
+
+_cache = OrderedDict()
+# Streamlit sessions share _cache from their own threads
+_lock = threading.Lock()
+
+
+class MatchupMatrix:
+    """
+    Predicted margin and win probability for every pair of teams in a
+    field (e.g. the 68 teams of get_team_seeds), computed at once from a
+    ranker's ratings. `margin[a, b]` is team a's rating minus team b's and
+    `probability[a, b]` the chance that a beats b, where a and b are
+    positions in `teams`.
+    """
+
+    def __init__(self, ranker: Ranker, teams=None):
+        result = ranker.ratings if ranker.ratings is not None \
+            else ranker.process()
+        self.registry = result.registry
+
+        field = np.arange(len(result)) if teams is None \
+            else np.asarray(result.indices(teams))
+        self.registry_index = field
+        self.teams = [self.registry.names[i] for i in field]
+
+        # Registry index -> position in the field, -1 outside it
+        self.position = np.full(len(self.registry), -1, dtype=np.intp)
+        self.position[field] = np.arange(len(field))
+
+        ratings = result.ratings[field]
+        self.scale = ranker.probability_scale or fit_rating_scale(
+            result.ratings, ranker.winner_index, ranker.loser_index)
+        self.margin = ratings[:, None] - ratings[None, :]
+        self.probability = win_probabilities(ratings, self.scale)
+
+    def __len__(self) -> int:
+        return len(self.teams)
+
+    def indices(self, teams):
+        """
+        Field position of one team, or an array of them, by name or
+        team_id.
+        """
+        if isinstance(teams, (str, int, np.integer)):
+            positions = self.position[self.registry.index(teams)]
+        else:
+            positions = self.position[self.registry.indices(teams)]
+        if np.any(positions < 0):
+            raise KeyError(f"{teams!r} is not in the matchup field")
+        return positions
+
+    def predicted_margin(self, team_a, team_b):
+        return self.margin[self.indices(team_a), self.indices(team_b)]
+
+    def win_probability(self, team_a, team_b):
+        return self.probability[self.indices(team_a), self.indices(team_b)]
+
+    def to_frame(self, values: str = "probability") -> pd.DataFrame:
+        return pd.DataFrame(
+            getattr(self, values), index=self.teams, columns=self.teams)
+
+
+def get_matchups(ranker: Ranker, teams=None) -> MatchupMatrix:
+    """
+    The MatchupMatrix for a ranker's current ratings, reused for as long as
+    the same ratings, season results and field are asked for again.
+    """
+    result = ranker.ratings if ranker.ratings is not None \
+        else ranker.process()
+    field = None if teams is None else np.asarray(result.indices(teams))
+
+    digest = hashlib.sha1()
+    for array in (
+            result.ratings, ranker.winner_index, ranker.loser_index, field):
+        digest.update(b"-" if array is None else array.tobytes())
+    key = digest.hexdigest()
+
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    matchups = MatchupMatrix(ranker, teams)
+    with _lock:
+        _cache[key] = matchups
+        _cache.move_to_end(key)
+        while len(_cache) > MATCHUP_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return matchups
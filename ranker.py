@@ -1,6 +1,29 @@
+import math
 import pandas as pd
 import numpy as np
-from math import ceil
+from decay import Segments, segment_index
+from instrumentation import span
+from registry import TeamRegistry
+from solvers import DenseSystem, GameSystemBatch, SparseSystem, \
+    conjugate_gradient
+
+# Leagues with more teams than this are solved with the sparse backend
+# when the solver is left on "auto".
+SPARSE_SOLVER_MIN_TEAMS = 1000
+
+# Upper bound on the dense matrices held at once by process_batch
+DENSE_BATCH_BYTES = 256 * 2**20
+
+# Number of games add_games absorbs as low-rank updates before it rebuilds
+# the system from scratch to discard accumulated rounding error.
+INCREMENTAL_REFRESH_GAMES = 500
+
+# Ridge penalty on Bradley-Terry log-strengths, which keeps unbeaten and
+# winless teams finite, the Newton iteration cap and how many times a step
+# may be halved.
+BRADLEY_TERRY_PRIOR = 0.1
+BRADLEY_TERRY_MAX_ITER = 100
+BRADLEY_TERRY_MAX_HALVINGS = 30
 
 
 class RankingOptions:
@@ -11,198 +34,989 @@ class RankingOptions:
             weight_neutral_win: float = 1,
             use_time_weights: bool = True,
             segment_weights: list[float] = [1],
+            time_decay=None,
+    ):
+        self.weight_home_win = float(weight_home_win)
+        self.weight_away_win = float(weight_away_win)
+        self.weight_neutral_win = float(weight_neutral_win)
+        self.use_time_weights = bool(use_time_weights)
+        # A tuple, so options can be hashed and used as cache keys
+        self.segment_weights = tuple(float(w) for w in segment_weights)
+        # A schedule from decay.py, used instead of the segment weights
+        self.time_decay = time_decay
+
+    @property
+    def time_weighting(self):
+        if self.time_decay is not None:
+            return self.time_decay
+        return Segments(self.segment_weights)
+
+    def _key(self) -> tuple:
+        return (
+            self.weight_home_win,
+            self.weight_away_win,
+            self.weight_neutral_win,
+            self.use_time_weights,
+            self.segment_weights,
+            self.time_decay,
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RankingOptions):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return (
+            f"RankingOptions({self.weight_home_win}, {self.weight_away_win}, "
+            f"{self.weight_neutral_win}, {self.use_time_weights}, "
+            f"{list(self.segment_weights)}"
+            + (f", time_decay={self.time_decay!r})"
+               if self.time_decay is not None else ")")
+        )
+
+
+def _team_indices(registry: TeamRegistry, teams):
+    if isinstance(teams, (str, int, np.integer)):
+        return registry.index(teams)
+    teams = np.asarray(teams)
+    if teams.dtype.kind in "iu":
+        return registry.indices_of_ids(teams)
+    return registry.indices(teams)
+
+
+class RatingsResult:
+    """
+    Ratings from one solve, indexed by registry index, with the rank of
+    every team. Teams can be looked up by name or team_id; the display
+    frame is only built when asked for.
+    """
+
+    def __init__(self, ratings: np.ndarray, registry: TeamRegistry):
+        self.ratings = ratings
+        self.registry = registry
+        self.order = np.argsort(-ratings)
+        self.ranks = np.empty(len(ratings), dtype=np.intp)
+        self.ranks[self.order] = np.arange(1, len(ratings) + 1)
+        self._frame = None
+
+    def __len__(self) -> int:
+        return len(self.ratings)
+
+    def indices(self, teams):
+        """
+        Registry index of one team, or an array of them for a list of names
+        or team_ids.
+        """
+        return _team_indices(self.registry, teams)
+
+    def rating_of(self, teams):
+        return self.ratings[self.indices(teams)]
+
+    def rank_of(self, teams):
+        return self.ranks[self.indices(teams)]
+
+    def to_frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            self._frame = pd.DataFrame({
+                "rank": np.arange(1, len(self) + 1),
+                "team": np.array(self.registry.names, dtype=object)[
+                    self.order],
+                "rating": self.ratings[self.order],
+            })
+        return self._frame
+
+
+class RatingsTrajectory:
+    """
+    Every team's rating as of the end of each day of the season: row d of
+    `ratings` (float32, indexed by registry index) only uses games played
+    on or before day `days[d]` (days_since_timestart).
+    """
+
+    def __init__(
+            self,
+            days: np.ndarray,
+            ratings: np.ndarray,
+            registry: TeamRegistry
     ):
-        self.weight_home_win = weight_home_win
-        self.weight_away_win = weight_away_win
-        self.weight_neutral_win = weight_neutral_win
-        self.use_time_weights = use_time_weights
-        self.segment_weights = segment_weights
+        self.days = days
+        self.ratings = ratings
+        self.registry = registry
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def as_of(self, day: int) -> RatingsResult:
+        row = np.searchsorted(self.days, day, side="right") - 1
+        if row < 0:
+            raise ValueError(f"No ratings before day {self.days[0]}")
+        return RatingsResult(
+            self.ratings[row].astype(np.float64), self.registry)
+
+    def to_frame(self, teams=None) -> pd.DataFrame:
+        """
+        Ratings by day (rows) and team name (columns), for all teams or a
+        list of names or team_ids.
+        """
+        index = np.arange(len(self.registry)) if teams is None \
+            else np.atleast_1d(_team_indices(self.registry, teams))
+        return pd.DataFrame(
+            self.ratings[:, index],
+            index=pd.Index(self.days, name="days_since_timestart"),
+            columns=np.array(self.registry.names, dtype=object)[index],
+        )
 
 
 class Ranker:
+    # Constant added to every diagonal entry, constant RHS term, and
+    # whether ratings are constrained to sum to zero (Massey).
+    diagonal = 0
+    rhs = 0
+    sum_to_zero = False
+    # Logistic scale of the rating difference when the ratings are
+    # calibrated win probabilities (None: fit it from the results)
+    probability_scale = None
+
     def __init__(
             self,
             games: pd.DataFrame,
             teams: pd.DataFrame,
-            options: RankingOptions
+            options: RankingOptions,
+            solver: str = "auto",
+            tol: float = 1e-10,
+            max_iter: int = None,
+            season_end: int = None,
+            registry: TeamRegistry = None,
+            time_weights: np.ndarray = None
     ):
-        self.games = games
+        if solver not in ("auto", "dense", "sparse"):
+            raise ValueError(
+                f"solver must be 'auto', 'dense' or 'sparse', not {solver!r}")
+
         self.teams = teams
         self.options = options
+        self.registry = registry if registry is not None \
+            else TeamRegistry(teams)
+        self.num_teams = len(self.registry)
+
+        self.solver = solver
+        self.tol = tol
+        self.max_iter = max_iter
+        self.iterations = 0
+
+        # A fixed season_end keeps the time segments stable while games are
+        # added with add_games; otherwise they span the games seen so far.
+        self.season_end = season_end
+        self._incremental = None
+        self.ratings = None
+
+        self._set_games(games)
+        # Precomputed weights for options.time_weighting, one per game
+        # (e.g. time_weighting.get_time_weights for get_data)
+        if time_weights is not None:
+            self._time_weights[options.time_weighting] = time_weights
+
+    def _set_games(self, games: pd.DataFrame):
+        self.games = games
         self.num_games = len(games)
-        self.num_teams = len(teams)
 
         self.day_before_season = games.loc[
             0, 'days_since_timestart'] - 1
         self.last_day_of_season = games.loc[
             len(games) - 1, 'days_since_timestart']
-
-    def process(self):
-        raise NotImplementedError
-
-
-class ColleyRanker(Ranker):
-
-    def process(self):
-
-        matrix = 2 * np.diag(np.ones(self.num_teams))
-
-        b = np.ones(self.num_teams)
-
-        for i in range(self.num_games):
+        if self.season_end is not None:
+            self.last_day_of_season = self.season_end
+
+        for name, values in self._game_arrays(games).items():
+            setattr(self, name, values)
+        self._segment_index = {}
+        self._time_weights = {}
+
+    def _game_arrays(self, games: pd.DataFrame) -> dict[str, np.ndarray]:
+        # Per-game arrays that do not depend on the ranking options
+        team_1_score = games['team_1_score'].to_numpy()
+        team_2_score = games['team_2_score'].to_numpy()
+        team_1_win = team_1_score > team_2_score
+
+        if 'team_1_index' in games:
+            # Compact games (data.compact_games) already hold the indices
+            team_1_index = games['team_1_index'].to_numpy(dtype=np.intp)
+            team_2_index = games['team_2_index'].to_numpy(dtype=np.intp)
+        else:
+            team_1_index = self.registry.indices_of_ids(games['team_1_id'])
+            team_2_index = self.registry.indices_of_ids(games['team_2_id'])
+        winner_homefield = np.where(
+            team_1_win,
+            games['team_1_homefield'].to_numpy(),
+            games['team_2_homefield'].to_numpy()
+        )
+
+        return {
+            "team_1_index": team_1_index,
+            "team_2_index": team_2_index,
+            "winner_index": np.where(team_1_win, team_1_index, team_2_index),
+            "loser_index": np.where(team_1_win, team_2_index, team_1_index),
+            # 0 = home win, 1 = away win, 2 = neutral win
+            "winner_location": np.select(
+                [winner_homefield == 1, winner_homefield == -1], [0, 1], 2),
+            "point_differential": np.abs(team_1_score - team_2_score),
+            "season_fraction": (
+                games['days_since_timestart'].to_numpy()
+                - self.day_before_season
+            ) / (self.last_day_of_season - self.day_before_season),
+        }
+
+    def segment_index(self, num_segments: int) -> np.ndarray:
+        # Which time segment each game falls in, for a given segment count
+        if num_segments not in self._segment_index:
+            self._segment_index[num_segments] = segment_index(
+                self.season_fraction, num_segments)
+        return self._segment_index[num_segments]
+
+    def time_weights(self, schedule, games=None) -> np.ndarray:
+        """
+        Time weight of every game, or of the games at positions `games`,
+        under a decay.py schedule.
+        """
+        if schedule in self._time_weights:
+            weights = self._time_weights[schedule]
+            return weights if games is None else weights[games]
+        fraction = self.season_fraction if games is None \
+            else self.season_fraction[games]
+        return schedule(fraction)
+
+    def game_weights(self, options: RankingOptions = None) -> np.ndarray:
+        return self.batch_game_weights([options or self.options])[0]
+
+    def batch_game_weights(
+            self,
+            options_list: list[RankingOptions]
+    ) -> np.ndarray:
+        location_weights = np.array([
             [
-                days_since_timestart,
-                date,
-                team_1_id,
-                team_1_name,
-                team_1_homefield,
-                team_1_score,
-                team_1_win,
-                team_2_id,
-                team_2_name,
-                team_2_homefield,
-                team_2_score,
-                team_2_win,
-                winning_score,
-                losing_score
-            ] = self.games.loc[i, :].values
-
-            team_1_index = team_1_id - 1
-            team_2_index = team_2_id - 1
-
-            num_segments = len(self.options.segment_weights)
-
-            weight_index = ceil(
-                num_segments * ((
-                     days_since_timestart - self.day_before_season) / (
-                    self.last_day_of_season - self.day_before_season
-                ))) - 1
-            time_weight = self.options.segment_weights[weight_index]
-
-            if team_1_score > team_2_score:
-                if team_1_homefield == 1:
-                    game_weight = self.options.weight_home_win * time_weight
-                elif team_1_homefield == -1:
-                    game_weight = self.options.weight_away_win * time_weight
-                else:
-                    game_weight = self.options.weight_neutral_win * time_weight
+                options.weight_home_win,
+                options.weight_away_win,
+                options.weight_neutral_win,
+            ]
+            for options in options_list
+        ], dtype=np.float64)
+        game_weights = location_weights[:, self.winner_location]
+
+        # Scenarios with the same number of segments share one gather
+        by_num_segments = {}
+        for s, options in enumerate(options_list):
+            schedule = options.time_weighting
+            if isinstance(schedule, Segments) \
+                    and schedule not in self._time_weights:
+                by_num_segments.setdefault(
+                    len(options.segment_weights), []).append(s)
             else:
-                if team_2_homefield == 1:
-                    game_weight = self.options.weight_home_win * time_weight
-                elif team_2_homefield == -1:
-                    game_weight = self.options.weight_away_win * time_weight
-                else:
-                    game_weight = self.options.weight_neutral_win * time_weight
-
-            matrix[team_1_index, team_1_index] += game_weight
-            matrix[team_2_index, team_2_index] += game_weight
-            matrix[team_1_index, team_2_index] -= game_weight
-            matrix[team_2_index, team_1_index] -= game_weight
-
-            if team_1_score > team_2_score:
-                b[team_1_index] += game_weight
-                b[team_2_index] -= game_weight
+                game_weights[s] *= self.time_weights(schedule)
+        for num_segments, scenarios in by_num_segments.items():
+            segment_weights = np.array(
+                [options_list[s].segment_weights for s in scenarios],
+                dtype=np.float64
+            )
+            game_weights[scenarios] *= segment_weights[
+                :, self.segment_index(num_segments)]
+
+        return game_weights
+
+    def game_values(self, game_weights: np.ndarray) -> np.ndarray:
+        # Amount each game moves from the loser's RHS entry to the winner's
+        return game_weights
+
+    def _scatter(self, index: np.ndarray, values: np.ndarray) -> np.ndarray:
+        # Sum per-game values into per-team totals along the last axis
+        n = self.num_teams
+        offsets = n * np.arange(len(values), dtype=np.intp)[:, None]
+        return np.bincount(
+            (offsets + index).ravel(),
+            weights=values.ravel(),
+            minlength=len(values) * n
+        ).reshape(len(values), n)
+
+    def _rhs(
+            self,
+            game_weights: np.ndarray,
+            constraint_row: bool = True
+    ) -> np.ndarray:
+        game_values = self.game_values(game_weights)
+        b = self.rhs + self._scatter(self.winner_index, game_values) \
+            - self._scatter(self.loser_index, game_values)
+
+        # The dense systems swap the last equation for the constraint row
+        if self.sum_to_zero and constraint_row:
+            b[:, -1] = 0
+        return b
+
+    def _dense_matrices(
+            self,
+            game_weights: np.ndarray,
+            constraint_row: bool = True
+    ) -> np.ndarray:
+        # Scatter every game into the matrix at once: each game adds its
+        # weight to both diagonal entries and subtracts it from the two
+        # off-diagonal entries. Both off-diagonal entries go through one
+        # bincount and the sign is flipped in place, so the stack is only
+        # allocated once.
+        n = self.num_teams
+
+        offsets = n * n * np.arange(len(game_weights), dtype=np.intp)
+        matrices = np.bincount(
+            np.concatenate([
+                offsets[:, None] + self.team_1_index * n + self.team_2_index,
+                offsets[:, None] + self.team_2_index * n + self.team_1_index,
+            ], axis=1).ravel(),
+            weights=np.concatenate([game_weights, game_weights], axis=1)
+            .ravel(),
+            minlength=len(game_weights) * n * n
+        ).reshape(len(game_weights), n, n)
+        np.negative(matrices, out=matrices)
+
+        diagonal = np.arange(n)
+        matrices[:, diagonal, diagonal] = self.diagonal + self._scatter(
+            self.team_1_index, game_weights
+        ) + self._scatter(self.team_2_index, game_weights)
+
+        if self.sum_to_zero:
+            if constraint_row:
+                matrices[:, -1, :] = 1
             else:
-                b[team_1_index] -= game_weight
-                b[team_2_index] += game_weight
-
-        r = np.linalg.solve(matrix, b)
-        i_sort = np.argsort(-r)
-
-        ratings = pd.DataFrame(columns=['rank', 'team', 'rating'])
-        for i in range(self.num_teams):
-            ratings.loc[i, :] = [
-                i+1,
-                self.teams.loc[i_sort[i], 'team_name'],
-                r[i_sort[i]]
-            ]
+                # Symmetric form: add 11^T instead of replacing a row
+                matrices += 1
+        return matrices
 
-        self.ratings = ratings
+    def assemble(
+            self,
+            game_weights: np.ndarray,
+            sparse: bool = False
+    ) -> tuple[np.ndarray, np.ndarray]:
+        b = self._rhs(game_weights[None, :], not sparse)[0]
+
+        if sparse:
+            # The sum-to-zero constraint is added as a symmetric 11^T term,
+            # which keeps the system positive definite for CG.
+            matrix = SparseSystem.from_games(
+                self.num_teams,
+                self.team_1_index,
+                self.team_2_index,
+                game_weights,
+                diagonal=self.diagonal,
+                ones_weight=1 if self.sum_to_zero else 0
+            )
+            return matrix, b
+
+        return self._dense_matrices(game_weights[None, :])[0], b
+
+    def use_sparse_solver(self) -> bool:
+        if self.solver == "auto":
+            return self.num_teams > SPARSE_SOLVER_MIN_TEAMS
+        return self.solver == "sparse"
+
+    def solve(self, game_weights: np.ndarray) -> np.ndarray:
+        sparse = self.use_sparse_solver()
+        with span("assemble", teams=self.num_teams, sparse=sparse):
+            matrix, b = self.assemble(game_weights, sparse=sparse)
+
+        with span("solve", teams=self.num_teams, sparse=sparse):
+            if sparse:
+                r, self.iterations = conjugate_gradient(
+                    matrix, b, tol=self.tol, max_iter=self.max_iter)
+                return r
+
+            self.iterations = 0
+            return np.linalg.solve(matrix, b)
+
+    def solve_batch(self, game_weights: np.ndarray) -> np.ndarray:
+        sparse = self.use_sparse_solver()
+        b = self._rhs(game_weights, not sparse)
+
+        if sparse:
+            matrix = GameSystemBatch(
+                self.num_teams,
+                self.team_1_index,
+                self.team_2_index,
+                game_weights,
+                diagonal=self.diagonal,
+                ones_weight=1 if self.sum_to_zero else 0
+            )
+            r, self.iterations = conjugate_gradient(
+                matrix, b, tol=self.tol, max_iter=self.max_iter)
+            return r
+
+        self.iterations = 0
+        return np.linalg.solve(
+            self._dense_matrices(game_weights), b[:, :, None])[:, :, 0]
+
+    def process_batch(
+            self,
+            options_list: list[RankingOptions],
+            batch_size: int = None
+    ) -> np.ndarray:
+        """
+        Rate every scenario in `options_list` and return a
+        (scenarios, teams) array of ratings, indexed by registry index.
+        """
+        if batch_size is None:
+            if self.use_sparse_solver():
+                batch_size = len(options_list)
+            else:
+                # np.linalg.solve factors a copy of each batch, so two
+                # stacks of matrices are alive at once
+                batch_size = DENSE_BATCH_BYTES // (
+                    2 * 8 * self.num_teams ** 2)
+        batch_size = max(1, batch_size)
+
+        ratings = np.empty((len(options_list), self.num_teams))
+        for start in range(0, len(options_list), batch_size):
+            stop = start + batch_size
+            with span("solve_batch", scenarios=stop - start):
+                ratings[start:stop] = self.solve_batch(
+                    self.batch_game_weights(options_list[start:stop]))
+        return ratings
+
+    def refresh(self) -> np.ndarray:
+        """
+        Solve the full system for the current games and keep the solver
+        state that add_games updates.
+        """
+        game_weights = self.game_weights()
+        b = self._rhs(game_weights[None, :], constraint_row=False)[0]
+
+        if self.use_sparse_solver():
+            inverse = None
+            matrix, _ = self.assemble(game_weights, sparse=True)
+            x0 = self._incremental["r"] if self._incremental else None
+            r, self.iterations = conjugate_gradient(
+                matrix, b, x0=x0, tol=self.tol, max_iter=self.max_iter)
+        else:
+            inverse = np.linalg.inv(self._dense_matrices(
+                game_weights[None, :], constraint_row=False)[0])
+            r = inverse @ b
+            self.iterations = 0
+
+        self._incremental = {
+            "inverse": inverse,
+            "b": b,
+            "r": r,
+            "pending_games": 0,
+        }
+        return r
+
+    def add_games(
+            self,
+            games: pd.DataFrame,
+            refresh_every: int = INCREMENTAL_REFRESH_GAMES
+    ) -> np.ndarray:
+        """
+        Absorb newly played games (same columns as get_data) and return the
+        updated ratings, indexed by registry index.
+
+        Each game changes the system by w * (e_i - e_j)(e_i - e_j)^T, so the
+        dense solver applies Sherman-Morrison updates to its stored inverse
+        and the sparse solver re-runs CG warm-started from the last ratings.
+        The system is rebuilt from scratch every `refresh_every` games, and
+        whenever a game falls past the end of the season with more than one
+        time segment in use (pass season_end to avoid that).
+        """
+        if self._incremental is None:
+            self.refresh()
+        if len(games) == 0:
+            return self._incremental["r"]
+        # A RatingsResult from process() no longer matches the games
+        self.ratings = None
+
+        all_games = pd.concat([self.games, games], ignore_index=True)
+        last_day = games['days_since_timestart'].max()
+        if (
+            last_day > self.last_day_of_season
+            and self.options.time_weighting != Segments()
+        ) or self._incremental["pending_games"] + len(games) > refresh_every:
+            self._set_games(all_games)
+            return self.refresh()
+
+        # The season bounds are unchanged, so only the new games need
+        # their arrays computed.
+        new_arrays = self._game_arrays(games)
+        self.games = all_games
+        self.num_games = len(all_games)
+        for name, values in new_arrays.items():
+            setattr(self, name, np.concatenate([getattr(self, name), values]))
+        self._segment_index = {}
+        self._time_weights = {}
+
+        game_weights = self.game_weights()
+        game_values = self.game_values(game_weights)
+        new = slice(self.num_games - len(games), self.num_games)
+
+        state = self._incremental
+        np.add.at(state["b"], self.winner_index[new], game_values[new])
+        np.subtract.at(state["b"], self.loser_index[new], game_values[new])
+        state["pending_games"] += len(games)
+
+        if state["inverse"] is None:
+            matrix, _ = self.assemble(game_weights, sparse=True)
+            state["r"], self.iterations = conjugate_gradient(
+                matrix,
+                state["b"],
+                x0=state["r"],
+                tol=self.tol,
+                max_iter=self.max_iter
+            )
+            return state["r"]
+
+        inverse = state["inverse"]
+        for i, j, w in zip(
+            self.team_1_index[new],
+            self.team_2_index[new],
+            game_weights[new]
+        ):
+            u = inverse[:, i] - inverse[:, j]
+            inverse -= np.outer(u, u) * (w / (1 + w * (u[i] - u[j])))
+        state["r"] = inverse @ state["b"]
+        return state["r"]
+
+    def process(self) -> RatingsResult:
+        with span(f"{type(self).__name__}.process"):
+            self.ratings = RatingsResult(
+                self.solve(self.game_weights()), self.registry)
         return self.ratings
 
+    def _days(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Every day from the first game to the last, the games in day
+        # order, and how many of them were played by the end of each day
+        days = self.games['days_since_timestart'].to_numpy()
+        order = np.argsort(days, kind="stable")
+        all_days = np.arange(days[order[0]], days[order[-1]] + 1)
+        played = np.searchsorted(days[order], all_days, side="right")
+        return all_days, order, played
+
+    def trajectory(self, options: RankingOptions = None) -> RatingsTrajectory:
+        """
+        Ratings as of the end of every day of the season. Each day's games
+        are added to running sums of the matrix (merged into the sparse
+        entries so far, or into the dense matrix) and right-hand side, and
+        the day is solved by CG starting from the day before. Time weights
+        use the bounds of the whole season, like process(). Until the
+        schedule connects every team, Massey ratings are only comparable
+        within each group of teams that have played each other.
+        """
+        game_weights = self.game_weights(options)
+        game_values = self.game_values(game_weights)
+        all_days, order, played = self._days()
+
+        n = self.num_teams
+        ones_weight = 1 if self.sum_to_zero else 0
+        sparse = self.use_sparse_solver()
+        if sparse:
+            # No games yet: just the diagonal, merged into day by day
+            system = SparseSystem.from_games(
+                n, self.team_1_index[:0], self.team_2_index[:0],
+                game_weights[:0], diagonal=self.diagonal,
+                ones_weight=ones_weight)
+        else:
+            matrix = np.full((n, n), float(ones_weight))
+            matrix[np.diag_indices(n)] += self.diagonal
+        b = np.full(n, float(self.rhs))
+        r = np.zeros(n)
+
+        ratings = np.empty((len(all_days), n), dtype=np.float32)
+        start = 0
+        with span("trajectory", days=len(all_days), teams=n, sparse=sparse):
+            for d, end in enumerate(played):
+                if end > start:
+                    new = order[start:end]
+                    np.add.at(b, self.winner_index[new], game_values[new])
+                    np.subtract.at(b, self.loser_index[new], game_values[new])
+
+                    i = self.team_1_index[new]
+                    j = self.team_2_index[new]
+                    w = game_weights[new]
+                    if sparse:
+                        system = system.add_games(i, j, w)
+                    else:
+                        np.add.at(matrix, (i, i), w)
+                        np.add.at(matrix, (j, j), w)
+                        np.subtract.at(matrix, (i, j), w)
+                        np.subtract.at(matrix, (j, i), w)
+                        system = DenseSystem(matrix)
+
+                    r, self.iterations = conjugate_gradient(
+                        system, b, x0=r, tol=self.tol,
+                        max_iter=self.max_iter)
+                    start = end
+                ratings[d] = r
+
+        return RatingsTrajectory(all_days, ratings, self.registry)
 
-class MasseyRanker(Ranker):
 
-    def process(self):
+class ColleyRanker(Ranker):
+    diagonal = 2
+    rhs = 1
 
-        matrix = np.zeros((self.num_teams, self.num_teams))
 
-        b = np.zeros(self.num_teams)
+class MasseyRanker(Ranker):
+    sum_to_zero = True
 
-        for i in range(self.num_games):
-            [
-                days_since_timestart,
-                date,
-                team_1_id,
-                team_1_name,
-                team_1_homefield,
-                team_1_score,
-                team_1_win,
-                team_2_id,
-                team_2_name,
-                team_2_homefield,
-                team_2_score,
-                team_2_win,
-                winning_score,
-                losing_score
-            ] = self.games.loc[i, :].values
-
-            team_1_index = team_1_id - 1
-            team_2_index = team_2_id - 1
-
-            num_segments = len(self.options.segment_weights)
-
-            weight_index = ceil(
-                num_segments * ((
-                    days_since_timestart - self.day_before_season
-                ) / (
-                    self.last_day_of_season-self.day_before_season
-                ))) - 1
-
-            time_weight = self.options.segment_weights[weight_index]
-
-            if team_1_score > team_2_score:
-                if team_1_homefield == 1:
-                    game_weight = self.options.weight_home_win * time_weight
-                elif team_1_homefield == -1:
-                    game_weight = self.options.weight_away_win * time_weight
-                else:
-                    game_weight = self.options.weight_neutral_win * time_weight
-            else:
-                if team_2_homefield == 1:
-                    game_weight = self.options.weight_home_win * time_weight
-                elif team_2_homefield == -1:
-                    game_weight = self.options.weight_away_win * time_weight
-                else:
-                    game_weight = self.options.weight_neutral_win * time_weight
-
-            matrix[team_1_index, team_1_index] += game_weight
-            matrix[team_2_index, team_2_index] += game_weight
-            matrix[team_1_index, team_2_index] -= game_weight
-            matrix[team_2_index, team_1_index] -= game_weight
-
-            point_differential = game_weight * abs(team_1_score - team_2_score)
-
-            if team_1_score > team_2_score:
-                b[team_1_index] += point_differential
-                b[team_2_index] -= point_differential
-            else:
-                b[team_1_index] -= point_differential
-                b[team_2_index] += point_differential
+    def game_values(self, game_weights: np.ndarray) -> np.ndarray:
+        return game_weights * self.point_differential
 
-        matrix[-1, :] = np.ones((1, self.num_teams))
-        b[-1] = 0
 
-        r = np.linalg.solve(matrix, b)
-        i_sort = np.argsort(-r)
+class EloRanker(Ranker):
+    """
+    Ratings from a single pass over the games in day order, at constant
+    cost per game, so new results can be added without a season-wide
+    solve.
 
-        ratings = pd.DataFrame(columns=['rank', 'team', 'rating'])
-        for i in range(self.num_teams):
-            ratings.loc[i, :] = [
-                i+1,
-                self.teams.loc[i_sort[i], 'team_name'],
-                r[i_sort[i]]
-            ]
+    A win moves k * weight * mov * (1 - expected) points from the loser to
+    the winner, where weight is the game weight from the ranking options
+    (location and time segment) and mov grows with the log of the margin
+    of victory, damped when the favourite wins (FiveThirtyEight's
+    multiplier). Games that fall past the end of the season count in the
+    last time segment; pass season_end to fix the segments up front.
+    """
 
-        self.ratings = ratings
+    def __init__(
+            self,
+            games: pd.DataFrame,
+            teams: pd.DataFrame,
+            options: RankingOptions,
+            k: float = 20,
+            initial_rating: float = 1500,
+            home_advantage: float = 0,
+            scale: float = 400,
+            season_end: int = None,
+            registry: TeamRegistry = None,
+            time_weights: np.ndarray = None
+    ):
+        super().__init__(
+            games, teams, options, season_end=season_end, registry=registry,
+            time_weights=time_weights)
+        self.k = k
+        self.initial_rating = initial_rating
+        self.home_advantage = home_advantage
+        self.scale = scale
+        self._state = self._initial_state()
+
+    def _initial_state(self) -> dict:
+        return {
+            "ratings": np.full(self.num_teams, float(self.initial_rating)),
+            "num_games": 0,
+        }
+
+    def _stream_weights(
+            self,
+            options: RankingOptions,
+            games: np.ndarray
+    ) -> np.ndarray:
+        # game_weights() for just these games
+        location_weights = np.array([
+            options.weight_home_win,
+            options.weight_away_win,
+            options.weight_neutral_win,
+        ])
+        return location_weights[self.winner_location[games]] \
+            * self.time_weights(options.time_weighting, games)
+
+    def _stream(
+            self,
+            ratings: np.ndarray,
+            options: RankingOptions,
+            games: np.ndarray
+    ) -> np.ndarray:
+        # Apply the games at positions `games`, in that order
+        weights = self._stream_weights(options, games)
+        home_bonus = np.array([self.home_advantage, -self.home_advantage, 0])
+
+        r = ratings.tolist()
+        for winner, loser, bonus, margin, weight in zip(
+            self.winner_index[games].tolist(),
+            self.loser_index[games].tolist(),
+            home_bonus[self.winner_location[games]].tolist(),
+            self.point_differential[games].tolist(),
+            weights.tolist(),
+        ):
+            gap = r[winner] - r[loser] + bonus
+            expected = 1 / (1 + 10 ** (-gap / self.scale))
+            mov = math.log1p(margin) * 2.2 / max(gap * 0.001 + 2.2, 0.1)
+            change = self.k * weight * mov * (1 - expected)
+            r[winner] += change
+            r[loser] -= change
+        return np.array(r)
+
+    def _catch_up(self) -> np.ndarray:
+        state = self._state
+        if state["num_games"] < self.num_games:
+            # New games in day order; ties keep their order in games
+            start = state["num_games"]
+            state["ratings"] = self._stream(
+                state["ratings"],
+                self.options,
+                start + np.argsort(
+                    self.season_fraction[start:], kind="stable")
+            )
+            state["num_games"] = self.num_games
+        return state["ratings"]
+
+    def checkpoint(self) -> dict:
+        """
+        The ratings after every game seen so far; pass it to restore() on a
+        ranker built with those games to carry on without replaying them.
+        """
+        self._catch_up()
+        return {
+            "ratings": self._state["ratings"].copy(),
+            "num_games": self._state["num_games"],
+            "team_ids": self.registry.ids.copy(),
+        }
+
+    def restore(self, checkpoint: dict):
+        if checkpoint["num_games"] > self.num_games:
+            raise ValueError(
+                f"checkpoint covers {checkpoint['num_games']} games but the "
+                f"ranker only has {self.num_games}")
+        if not np.array_equal(checkpoint["team_ids"], self.registry.ids):
+            raise ValueError("checkpoint was taken with different teams")
+        self._state = {
+            "ratings": checkpoint["ratings"].copy(),
+            "num_games": checkpoint["num_games"],
+        }
+        self.ratings = None
+
+    def add_games(self, games: pd.DataFrame) -> np.ndarray:
+        """
+        Apply newly played games (same columns as get_data) on top of the
+        current ratings and return them, indexed by registry index.
+        """
+        if len(games) > 0:
+            self.ratings = None
+            new_arrays = self._game_arrays(games)
+            self.games = pd.concat([self.games, games], ignore_index=True)
+            self.num_games = len(self.games)
+            for name, values in new_arrays.items():
+                setattr(
+                    self, name, np.concatenate([getattr(self, name), values]))
+            self._segment_index = {}
+            self._time_weights = {}
+        return self._catch_up()
+
+    def process_batch(
+            self,
+            options_list: list[RankingOptions],
+            batch_size: int = None
+    ) -> np.ndarray:
+        ratings = np.empty((len(options_list), self.num_teams))
+        order = np.argsort(self.season_fraction, kind="stable")
+        with span("stream_batch", scenarios=len(options_list)):
+            for s, options in enumerate(options_list):
+                ratings[s] = self._stream(
+                    self._initial_state()["ratings"], options, order)
+        return ratings
+
+    def trajectory(self, options: RankingOptions = None) -> RatingsTrajectory:
+        # The stream is already in day order: record it at each day's end
+        options = options or self.options
+        all_days, order, played = self._days()
+
+        r = self._initial_state()["ratings"]
+        ratings = np.empty((len(all_days), self.num_teams), dtype=np.float32)
+        start = 0
+        with span("trajectory", days=len(all_days)):
+            for d, end in enumerate(played):
+                if end > start:
+                    r = self._stream(r, options, order[start:end])
+                    start = end
+                ratings[d] = r
+        return RatingsTrajectory(all_days, ratings, self.registry)
+
+    def process(self) -> RatingsResult:
+        with span(f"{type(self).__name__}.process"):
+            self.ratings = RatingsResult(
+                self._catch_up().copy(), self.registry)
         return self.ratings
+
+
+class BradleyTerryRanker(Ranker):
+    """
+    Maximum-likelihood Bradley-Terry log-strengths: team a beats team b
+    with probability 1 / (1 + exp(r_b - r_a)), each game counting with its
+    game weight.
+
+    Fitted by Newton's method with step halving, whose Hessian is a weighted
+    game matrix like Colley's (solved dense or with CG like the other
+    rankers). Every fit starts from the previous solution, or from
+    `warm_start` (ratings indexed by registry index) on the first, so refits
+    after small changes to the games or options take a few iterations; a
+    warm start that fails to converge is retried from zero. `tol` is the
+    largest rating change at which the fit has converged and `max_iter` the
+    Newton iteration cap.
+    """
+    probability_scale = 1
+
+    def __init__(
+            self,
+            games: pd.DataFrame,
+            teams: pd.DataFrame,
+            options: RankingOptions,
+            prior: float = BRADLEY_TERRY_PRIOR,
+            solver: str = "auto",
+            tol: float = 1e-9,
+            max_iter: int = BRADLEY_TERRY_MAX_ITER,
+            warm_start: np.ndarray = None,
+            season_end: int = None,
+            registry: TeamRegistry = None,
+            time_weights: np.ndarray = None
+    ):
+        super().__init__(
+            games, teams, options, solver=solver, tol=tol, max_iter=max_iter,
+            season_end=season_end, registry=registry,
+            time_weights=time_weights)
+        self.diagonal = prior
+        self._solution = None if warm_start is None \
+            else np.array(warm_start, dtype=np.float64)
+
+    def _team_totals(self, values: np.ndarray) -> np.ndarray:
+        # Winner minus loser sum of per-game values
+        n = self.num_teams
+        return np.bincount(self.winner_index, values, minlength=n) \
+            - np.bincount(self.loser_index, values, minlength=n)
+
+    def log_likelihood(
+            self,
+            r: np.ndarray,
+            game_weights: np.ndarray
+    ) -> float:
+        # Weighted log-likelihood of the results, less the ridge penalty
+        return -np.sum(game_weights * np.logaddexp(
+            0, r[self.loser_index] - r[self.winner_index])) \
+            - self.diagonal / 2 * np.dot(r, r)
+
+    def fit(
+            self,
+            game_weights: np.ndarray,
+            x0: np.ndarray = None
+    ) -> np.ndarray:
+        if x0 is None or np.shape(x0) != (self.num_teams,):
+            # No start, or one from a league of a different size
+            return self._newton(game_weights, np.zeros(self.num_teams))
+        try:
+            return self._newton(
+                game_weights, np.array(x0, dtype=np.float64))
+        except np.linalg.LinAlgError:
+            # A start far from this fit's solution; start over
+            return self._newton(game_weights, np.zeros(self.num_teams))
+
+    def _newton(self, game_weights: np.ndarray, r: np.ndarray) -> np.ndarray:
+        sparse = self.use_sparse_solver()
+        objective = self.log_likelihood(r, game_weights)
+
+        for iteration in range(1, self.max_iter + 1):
+            # Probability of each game's actual result
+            p = 1 / (1 + np.exp(r[self.loser_index] - r[self.winner_index]))
+            gradient = self._team_totals(game_weights * (1 - p)) \
+                - self.diagonal * r
+            curvature = game_weights * p * (1 - p)
+
+            if sparse:
+                matrix = SparseSystem.from_games(
+                    self.num_teams,
+                    self.team_1_index,
+                    self.team_2_index,
+                    curvature,
+                    diagonal=self.diagonal
+                )
+                step, _ = conjugate_gradient(matrix, gradient)
+            else:
+                step = np.linalg.solve(
+                    self._dense_matrices(curvature[None, :])[0], gradient)
+
+            newton_step = np.max(np.abs(step))
+            # Halve the step until it does not lower the objective; full
+            # steps from a distant start can overshoot and oscillate
+            for _ in range(BRADLEY_TERRY_MAX_HALVINGS):
+                candidate = r + step
+                value = self.log_likelihood(candidate, game_weights)
+                if value >= objective - 1e-12 * abs(objective):
+                    break
+                step /= 2
+            r, objective = candidate, value
+
+            if newton_step <= self.tol:
+                self.iterations = iteration
+                return r
+
+        raise np.linalg.LinAlgError(
+            f"Bradley-Terry fit did not converge in {self.max_iter} "
+            "iterations"
+        )
+
+    def solve(self, game_weights: np.ndarray) -> np.ndarray:
+        with span("fit", teams=self.num_teams):
+            self._solution = self.fit(game_weights, self._solution)
+        return self._solution.copy()
+
+    def process_batch(
+            self,
+            options_list: list[RankingOptions],
+            batch_size: int = None
+    ) -> np.ndarray:
+        # Each scenario starts from the one before, so nearby options (a
+        # tuning grid) converge quickly.
+        ratings = np.empty((len(options_list), self.num_teams))
+        with span("fit_batch", scenarios=len(options_list)):
+            game_weights = self.batch_game_weights(options_list)
+            x0 = self._solution
+            for s in range(len(options_list)):
+                ratings[s] = x0 = self.fit(game_weights[s], x0)
+        return ratings
+
+    def add_games(self, games: pd.DataFrame) -> np.ndarray:
+        """
+        Absorb newly played games (same columns as get_data) and refit from
+        the current ratings; returns them indexed by registry index.
+        """
+        if len(games) > 0:
+            self.ratings = None
+            self._set_games(
+                pd.concat([self.games, games], ignore_index=True))
+        return self.solve(self.game_weights())
+
+    def trajectory(self, options: RankingOptions = None) -> RatingsTrajectory:
+        # Each day is refitted from the day before, with the games not yet
+        # played given zero weight
+        game_weights = self.game_weights(options)
+        days = self.games['days_since_timestart'].to_numpy()
+        all_days, _, played = self._days()
+
+        ratings = np.empty((len(all_days), self.num_teams), dtype=np.float32)
+        r = None
+        with span("trajectory", days=len(all_days)):
+            for d, day in enumerate(all_days):
+                if d == 0 or played[d] > played[d - 1]:
+                    r = self.fit(np.where(days <= day, game_weights, 0), r)
+                ratings[d] = r
+        return RatingsTrajectory(all_days, ratings, self.registry)
+
+    def win_probability(self, team_a, team_b):
+        """
+        Probability that team_a beats team_b, by name or team_id, from the
+        last process() call.
+        """
+        result = self.ratings if self.ratings is not None \
+            else self.process()
+        margin = result.rating_of(team_a) - result.rating_of(team_b)
+        return 1 / (1 + np.exp(-margin))
+
+
+# Ranking methods by the names the app, CLI and scripts use
+RANKERS = {
+    "Colley": ColleyRanker,
+    "Massey": MasseyRanker,
+    "Elo": EloRanker,
+    "Bradley-Terry": BradleyTerryRanker,
+}
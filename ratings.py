@@ -0,0 +1,147 @@
+"""
+Ratings for the app, computed once per (data snapshot, method, options) and
+shared by every rerun and every session.
+"""
+import threading
+from collections import OrderedDict
+
+from cache import cache_resource
+from data import get_data, get_data_version, get_registry, get_teams
+from decay import ExponentialDecay
+from instrumentation import span
+from matchups import MATCHUP_CACHE_SIZE, MatchupMatrix
+from ranker import RANKERS, BradleyTerryRanker, RankingOptions, \
+    RatingsResult
+from time_weighting import get_time_weights
+
+# Number of rating results kept; each is a few arrays of one value per team
+RATINGS_CACHE_SIZE = 256
+
+# Options warmed for every method when the cache is created: the app's
+# initial form (two equal time segments), no time weighting, a
+# recency-weighted season and the default exponential decay.
+PRESETS = [
+    RankingOptions(segment_weights=[1.0, 1.0]),
+    RankingOptions(segment_weights=[1]),
+    RankingOptions(segment_weights=[0.5, 1.0, 1.5]),
+    RankingOptions(time_decay=ExponentialDecay()),
+]
+
+
+class RatingsCache:
+    """
+    Least-recently-used store of RatingsResult (and the matchup matrices
+    built from them), safe to share between the threads Streamlit runs
+    sessions on.
+    """
+
+    def __init__(self, max_entries: int = RATINGS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: tuple, compute) -> RatingsResult:
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+
+        # Solved outside the lock so other sessions are not held up; two
+        # sessions asking for the same new key at once both compute it.
+        result = compute()
+
+        with self._lock:
+            self.misses += 1
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result
+
+    def latest(self, data_version: str, method: str) -> RatingsResult:
+        # Most recently used result for a method on this data, or None
+        with self._lock:
+            for key in reversed(self._results):
+                if key[:2] == (data_version, method):
+                    return self._results[key]
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+def get_ratings(method: str, options: RankingOptions) -> RatingsResult:
+    """
+    Ratings for one method and set of options, computed only if no session
+    has asked for them on the current data yet.
+    """
+    cache = get_ratings_cache()
+    data_version = get_data_version()
+
+    def compute() -> RatingsResult:
+        kwargs = {"time_weights": get_time_weights(options.time_weighting)}
+        if RANKERS[method] is BradleyTerryRanker:
+            # Start from the options another session asked for last
+            previous = cache.latest(data_version, method)
+            if previous is not None:
+                kwargs["warm_start"] = previous.ratings
+        with span("compute_ratings", method=method):
+            ranker = RANKERS[method](
+                get_data(), get_teams(), options, registry=get_registry(),
+                **kwargs)
+            return ranker.process()
+
+    key = (data_version, method, options)
+    return cache.get(key, compute)
+
+
+@cache_resource
+def get_ratings_cache() -> RatingsCache:
+    return RatingsCache()
+
+
+def get_matchup_matrix(
+        method: str,
+        options: RankingOptions,
+        teams
+) -> MatchupMatrix:
+    """
+    The MatchupMatrix of the field `teams` for get_ratings(method, options),
+    built once per data snapshot; later head-to-head queries are array
+    reads.
+    """
+    teams = tuple(teams)
+
+    def compute() -> MatchupMatrix:
+        # The ranker only supplies the season results for the rating scale
+        ranker = RANKERS[method](
+            get_data(), get_teams(), options, registry=get_registry())
+        ranker.ratings = get_ratings(method, options)
+        return MatchupMatrix(ranker, list(teams))
+
+    key = (get_data_version(), method, options, teams)
+    return get_matchups_cache().get(key, compute)
+
+
+@cache_resource
+def get_matchups_cache() -> RatingsCache:
+    return RatingsCache(MATCHUP_CACHE_SIZE)
+
+
+@cache_resource
+def warm_ratings_cache() -> RatingsCache:
+    """
+    Compute the presets for every method. Cached, so only the first script
+    run after the server starts pays for it.
+    """
+    for options in PRESETS:
+        for method in RANKERS:
+            get_ratings(method, options)
+    return get_ratings_cache()
@@ -0,0 +1,85 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+def _key(name: str) -> str:
+    # Spelling differences the feeds disagree on: case, underscores for
+    # spaces, repeated whitespace and abbreviation periods
+    name = name.replace("_", " ").replace(".", "").casefold()
+    return re.sub(r"\s+", " ", name).strip()
+
+
+class TeamRegistry:
+    """
+    Dense integer index for every team in a teams table (get_teams), with
+    hash lookups from team_id, canonical name and any known alias.
+
+    Index `i` is row `i` of the teams table, which is also the row/column a
+    Ranker uses for that team.
+    """
+
+    def __init__(self, teams: pd.DataFrame, aliases: dict[str, str] = None):
+        self.ids = teams["team_id"].to_numpy(dtype=np.int64)
+        self.names = teams["team_name"].tolist()
+
+        # team_id -> index as an array, so whole id columns map at once
+        self.id_index = np.full(self.ids.max() + 1, -1, dtype=np.intp)
+        self.id_index[self.ids] = np.arange(len(self.ids))
+
+        self._index = {}
+        for i, name in enumerate(self.names):
+            self.add_alias(name, i)
+        if "raw_team_name" in teams:
+            for i, name in enumerate(teams["raw_team_name"]):
+                self.add_alias(name, i)
+        for alias, name in (aliases or {}).items():
+            if _key(name) in self._index:
+                self.add_alias(alias, self._index[_key(name)])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, team) -> bool:
+        try:
+            self.index(team)
+        except KeyError:
+            return False
+        return True
+
+    def add_alias(self, alias: str, index: int):
+        # The first team registered under a spelling keeps it
+        self._index.setdefault(_key(alias), index)
+
+    def index(self, team) -> int:
+        """
+        Index of a team given its team_id or any known name.
+        """
+        if isinstance(team, (int, np.integer)):
+            if 0 <= team < len(self.id_index) and self.id_index[team] >= 0:
+                return int(self.id_index[team])
+            raise KeyError(f"No team with id {team}")
+
+        try:
+            return self._index[_key(team)]
+        except KeyError:
+            raise KeyError(f"No team named {team!r}") from None
+
+    def indices(self, teams) -> np.ndarray:
+        return np.array([self.index(team) for team in teams], dtype=np.intp)
+
+    def indices_of_ids(self, team_ids) -> np.ndarray:
+        return self.id_index[np.asarray(team_ids)]
+
+    def play_in_indices(self, name: str) -> tuple[int, ...]:
+        """
+        Indices of both teams in a First Four slot written as "A/B".
+        """
+        return tuple(self.index(team) for team in name.split("/"))
+
+    def name(self, team) -> str:
+        return self.names[self.index(team)]
+
+    def team_id(self, team) -> int:
+        return int(self.ids[self.index(team)])
@@ -0,0 +1,253 @@
+"""
+The ingested season published once as immutable Arrow IPC files that every
+app worker process memory-maps, instead of each one downloading, parsing
+and caching its own copy (and Streamlit copying it again for every
+session).
+
+    MARCH_MADNESS_SHARED_DIR=/srv/march_madness python shared.py publish
+    MARCH_MADNESS_SHARED_DIR=/srv/march_madness streamlit run app.py
+
+A publish writes a new version directory (games.arrow, teams.arrow and,
+when available, bracket.arrow) and then atomically replaces the CURRENT
+pointer, so readers see the old version or the new one, never a partial
+write. Readers look at the pointer at most every SHARED_CHECK_SECONDS and
+map the new version when it changes; replaced versions stay readable for
+as long as a worker still has them mapped.
+
+The games table is served zero-copy from the page cache and is read-only.
+The teams and bracket tables hold strings, so each caller gets a (small)
+copy as before.
+
+Sharing is off unless MARCH_MADNESS_SHARED_DIR is set.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+SHARED_DIR = os.environ.get("MARCH_MADNESS_SHARED_DIR") or None
+
+# How often a worker checks whether a new version has been published
+SHARED_CHECK_SECONDS = float(os.environ.get(
+    "MARCH_MADNESS_SHARED_CHECK", 5))
+
+# Versions kept on disk, so workers that have not noticed a swap yet can
+# still map the version they were told about
+KEEP_VERSIONS = 3
+
+POINTER = "CURRENT"
+
+
+def _write_table(frame: pd.DataFrame, path: Path, metadata: dict = None):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            **{k: json.dumps(v) for k, v in metadata.items()},
+        })
+    with open(path, "wb") as f:
+        with pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _map_table(path: Path):
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+class PublishedSeason:
+    """
+    One published version, mapped. `games` is backed by the mapped file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.version = path.name
+
+        games = _map_table(path / "games.arrow")
+        metadata = games.schema.metadata or {}
+        self.published_at = json.loads(
+            metadata.get(b"published_at", b"null"))
+        # One block per column, so pandas keeps pointing at the mapping
+        self.games = games.to_pandas(split_blocks=True, zero_copy_only=True)
+
+        self._teams = _map_table(path / "teams.arrow").to_pandas()
+        bracket_path = path / "bracket.arrow"
+        self._bracket = None
+        if bracket_path.exists():
+            self._bracket = _map_table(bracket_path).to_pandas()
+            # The Final Four has no next game, so Arrow hands the column
+            # back as float64
+            self._bracket["next_game_id"] = \
+                self._bracket["next_game_id"].astype("Int64")
+
+    @property
+    def teams(self) -> pd.DataFrame:
+        return self._teams.copy()
+
+    @property
+    def bracket(self) -> pd.DataFrame:
+        return None if self._bracket is None else self._bracket.copy()
+
+
+def season_version(
+        games: pd.DataFrame,
+        teams: pd.DataFrame,
+        bracket: pd.DataFrame = None
+) -> str:
+    """
+    Version name for everything a publish writes, so a new bracket or team
+    list is published even when the games have not changed.
+    """
+    from data import frame_version
+
+    frames = [games, teams] + ([] if bracket is None else [bracket])
+    return hashlib.sha1(
+        "".join(frame_version(frame) for frame in frames).encode()
+    ).hexdigest()
+
+
+def publish(
+        games: pd.DataFrame,
+        teams: pd.DataFrame,
+        version: str,
+        bracket: pd.DataFrame = None,
+        directory=None
+) -> Path:
+    """
+    Write a version (compact games as data.compact_games, teams and
+    optionally the bracket) and make it current. Publishing the current
+    version again does nothing.
+    """
+    directory = Path(directory or SHARED_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / version
+
+    if not target.exists():
+        staging = directory / f".staging-{os.getpid()}-{time.time_ns()}"
+        staging.mkdir()
+        try:
+            _write_table(games, staging / "games.arrow", {
+                "version": version, "published_at": time.time()})
+            _write_table(teams, staging / "teams.arrow")
+            if bracket is not None:
+                _write_table(bracket, staging / "bracket.arrow")
+            os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    pointer = directory / f".{POINTER}-{os.getpid()}"
+    pointer.write_text(version)
+    os.replace(pointer, directory / POINTER)
+
+    _remove_old_versions(directory, keep=version)
+    return target
+
+
+def _remove_old_versions(directory: Path, keep: str):
+    versions = sorted(
+        (p for p in directory.iterdir()
+         if p.is_dir() and not p.name.startswith(".") and p.name != keep),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old in versions[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def current_version(directory=None) -> str:
+    try:
+        return (Path(directory or SHARED_DIR) / POINTER).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+_lock = threading.Lock()
+_state = {"checked": 0.0, "season": None}
+
+
+def load_published() -> PublishedSeason:
+    """
+    The current published season for this process, or None when sharing
+    is off or nothing has been published yet.
+    """
+    if SHARED_DIR is None:
+        return None
+
+    with _lock:
+        now = time.monotonic()
+        if now - _state["checked"] < SHARED_CHECK_SECONDS:
+            return _state["season"]
+        _state["checked"] = now
+
+        version = current_version()
+        season = _state["season"]
+        if version is not None and (
+                season is None or season.version != version):
+            try:
+                _state["season"] = PublishedSeason(Path(SHARED_DIR) / version)
+            except FileNotFoundError:
+                # Swapped again while we read the pointer; keep what we
+                # have and look again next time
+                pass
+        return _state["season"]
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--dir", default=SHARED_DIR,
+        help="shared directory (default: MARCH_MADNESS_SHARED_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    publish_parser = commands.add_parser(
+        "publish", help="publish the current season from the snapshots")
+    publish_parser.add_argument(
+        "--bracket-html", help="bracket page saved locally")
+    publish_parser.add_argument(
+        "--no-bracket", action="store_true",
+        help="publish without the bracket")
+    commands.add_parser("status", help="print the current version")
+
+    args = parser.parse_args(argv)
+    if args.dir is None:
+        parser.error("set MARCH_MADNESS_SHARED_DIR or pass --dir")
+
+    if args.command == "status":
+        print(current_version(args.dir) or "nothing published")
+        return
+
+    from bracket import BRACKET_URL, fetch_bracket_html, parse_bracket_html
+    from data import CURRENT_SEASON, load_season
+
+    games, teams = load_season(CURRENT_SEASON)
+    bracket = None
+    if not args.no_bracket:
+        if args.bracket_html:
+            with open(args.bracket_html, encoding="utf-8") as f:
+                html = f.read()
+        else:
+            html = fetch_bracket_html(BRACKET_URL)
+        bracket = parse_bracket_html(html)
+
+    path = publish(
+        games, teams, season_version(games, teams, bracket),
+        bracket=bracket,
+        directory=args.dir)
+    print(f"published {path.name} ({len(games)} games)")
+
+
+if __name__ == "__main__":
+    main()
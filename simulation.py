@@ -0,0 +1,126 @@
+import pandas as pd
+import numpy as np
+from tournament import Tournament
+
+# Column label for the stage a team reaches by winning a game in each round
+ADVANCEMENT_COLUMNS = {
+    0: "round_of_64",
+    1: "round_of_32",
+    2: "sweet_16",
+    3: "elite_8",
+    4: "final_4",
+    5: "championship_game",
+    6: "champion",
+}
+
+
+def win_probabilities(ratings: np.ndarray, scale: float) -> np.ndarray:
+    """
+    Matrix whose [a, b] entry is the probability that team a beats team b,
+    using a logistic curve in the rating difference.
+    """
+    return 1 / (1 + np.exp(-(ratings[:, None] - ratings[None, :]) / scale))
+
+
+def fit_rating_scale(
+        ratings: np.ndarray,
+        winner_index: np.ndarray,
+        loser_index: np.ndarray,
+        max_iter: int = 50
+) -> float:
+    """
+    Maximum-likelihood logistic scale for a set of ratings, fitted on the
+    season's results (e.g. ranker.winner_index / ranker.loser_index).
+    """
+    margin = ratings[winner_index] - ratings[loser_index]
+    beta = 1 / np.std(margin)
+
+    for _ in range(max_iter):
+        p = 1 / (1 + np.exp(-beta * margin))
+        gradient = np.sum(margin * (1 - p))
+        hessian = -np.sum(margin ** 2 * p * (1 - p))
+        step = gradient / hessian
+        beta -= step
+        if abs(step) <= 1e-10 * beta:
+            break
+
+    return 1 / beta
+
+
+def simulate_tournament(
+        tournament: Tournament,
+        ratings: np.ndarray,
+        scale: float,
+        num_sims: int = 100_000,
+        chunk_size: int = 100_000,
+        seed: int = None,
+        probabilities: np.ndarray = None
+) -> pd.DataFrame:
+    """
+    Play the bracket `num_sims` times and return, for every team, the
+    probability of reaching each stage of the tournament.
+
+    `ratings` are in tournament team order (Tournament.team_ratings). Every
+    round is resolved for a whole chunk of simulations at once; memory is
+    bounded by `chunk_size`. Results are reproducible for a given `seed`
+    and `chunk_size`.
+
+    A precomputed win probability matrix in tournament team order (e.g.
+    from matchups.get_matchups(ranker, tournament.teams)) is used instead
+    of `ratings` and `scale` when given.
+    """
+    rng = np.random.default_rng(seed)
+    num_teams = tournament.num_teams
+
+    if probabilities is None:
+        probabilities = win_probabilities(ratings, scale)
+    probabilities = probabilities.astype(np.float32)
+    slot_dtype = np.int16 if num_teams < 2**15 else np.intp
+
+    wins = np.zeros((len(tournament.rounds), num_teams), dtype=np.int64)
+    for start in range(0, num_sims, chunk_size):
+        n = min(chunk_size, num_sims - start)
+
+        slots = np.empty((n, tournament.num_games, 2), dtype=slot_dtype)
+        slots[:] = tournament.slots
+
+        for k, games in enumerate(tournament.round_games):
+            team_a = slots[:, games, 0]
+            team_b = slots[:, games, 1]
+            p = probabilities[team_a, team_b]
+            winners = np.where(
+                rng.random(p.shape, dtype=np.float32) < p, team_a, team_b)
+
+            wins[k] += np.bincount(winners.ravel(), minlength=num_teams)
+
+            next_game = tournament.next_game[games]
+            advancing = next_game >= 0
+            slots[
+                :,
+                next_game[advancing],
+                tournament.next_spot[games][advancing]
+            ] = winners[:, advancing]
+
+    # Teams placed directly into round 1 reach it in every simulation
+    reached_first_round = np.zeros(num_teams)
+    direct_entries = tournament.slots[tournament.round == 1].ravel()
+    reached_first_round[direct_entries[direct_entries >= 0]] = 1
+
+    advancement = pd.DataFrame({
+        "team": tournament.teams,
+        "seed": pd.array(tournament.seeds).astype("Int64"),
+        ADVANCEMENT_COLUMNS[0]: reached_first_round,
+    })
+    for k, r in enumerate(tournament.rounds):
+        if r == 0:
+            advancement[ADVANCEMENT_COLUMNS[0]] += wins[k] / num_sims
+        else:
+            advancement[ADVANCEMENT_COLUMNS[r]] = wins[k] / num_sims
+
+    advancement.sort_values(
+        by=ADVANCEMENT_COLUMNS[tournament.rounds[-1]],
+        ascending=False,
+        inplace=True
+    )
+    advancement.reset_index(drop=True, inplace=True)
+    return advancement
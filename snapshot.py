@@ -0,0 +1,193 @@
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Local columnar copies of the Massey feeds live here, one directory per
+# feed, as numbered Parquet versions plus a manifest describing the latest.
+SNAPSHOT_DIR = Path(os.environ.get(
+    "MARCH_MADNESS_SNAPSHOT_DIR",
+    Path(__file__).resolve().parent / "snapshots"
+))
+
+# How long a snapshot is served without asking the server whether it changed
+SNAPSHOT_TTL_SECONDS = int(os.environ.get(
+    "MARCH_MADNESS_SNAPSHOT_TTL", 6 * 60 * 60))
+
+# Serve the last good snapshot without touching the network
+OFFLINE = os.environ.get("MARCH_MADNESS_OFFLINE", "") not in ("", "0")
+
+KEEP_VERSIONS = 3
+REQUEST_TIMEOUT_SECONDS = 30
+
+
+class SnapshotUnavailable(RuntimeError):
+    pass
+
+
+def _feed_dir(feed: str) -> Path:
+    return SNAPSHOT_DIR / feed
+
+
+def _read_manifest(feed: str) -> dict:
+    path = _feed_dir(feed) / "manifest.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def _write_atomic(path: Path, data: bytes):
+    # Readers only ever see a complete file: write aside, then rename
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _write_manifest(feed: str, manifest: dict):
+    _write_atomic(
+        _feed_dir(feed) / "manifest.json",
+        json.dumps(manifest, indent=2).encode()
+    )
+
+
+def _read_version(
+        feed: str,
+        manifest: dict,
+        dtype: dict = None
+) -> pd.DataFrame:
+    df = pd.read_parquet(_feed_dir(feed) / manifest["file"])
+    return df.astype(dtype) if dtype else df
+
+
+def write_snapshot(
+        feed: str,
+        df: pd.DataFrame,
+        source: str,
+        content_hash: str = None,
+        etag: str = None,
+        last_modified: str = None,
+        fetched_at: float = None
+) -> dict:
+    """
+    Store `df` as the next version of `feed` and point the manifest at it.
+    """
+    feed_dir = _feed_dir(feed)
+    feed_dir.mkdir(parents=True, exist_ok=True)
+
+    previous = _read_manifest(feed)
+    version = previous["version"] + 1 if previous else 1
+    file_name = f"v{version:05d}.parquet"
+
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    _write_atomic(feed_dir / file_name, buffer.getvalue())
+
+    manifest = {
+        "version": version,
+        "file": file_name,
+        "source": source,
+        "rows": len(df),
+        "content_hash": content_hash,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": time.time() if fetched_at is None else fetched_at,
+    }
+    _write_manifest(feed, manifest)
+
+    for old in sorted(feed_dir.glob("v*.parquet"))[:-KEEP_VERSIONS]:
+        old.unlink(missing_ok=True)
+
+    return manifest
+
+
+def load_feed(
+        feed: str,
+        url: str,
+        columns: list[str],
+        dtype: dict = None,
+        ttl: float = None,
+        offline: bool = None
+) -> pd.DataFrame:
+    """
+    Return the headerless CSV feed at `url` as a DataFrame with the given
+    column names and dtypes, going through the local snapshot for `feed`.
+    With no `url`, only the local snapshot is used.
+
+    A snapshot younger than `ttl` seconds is read straight from disk. An
+    older one is revalidated with a conditional request (ETag /
+    Last-Modified, then a content hash); only a changed feed is parsed and
+    written as a new version. When offline, or when the server cannot be
+    reached, the last good snapshot is served instead.
+    """
+    ttl = SNAPSHOT_TTL_SECONDS if ttl is None else ttl
+    offline = OFFLINE if offline is None else offline
+    manifest = _read_manifest(feed)
+
+    if manifest and (
+        offline or url is None or time.time() - manifest["fetched_at"] < ttl
+    ):
+        return _read_version(feed, manifest, dtype)
+    if offline or url is None:
+        raise SnapshotUnavailable(
+            f"No local snapshot for '{feed}' in {SNAPSHOT_DIR} "
+            "and it cannot be downloaded"
+        )
+
+    import requests
+
+    headers = {}
+    if manifest and manifest.get("etag"):
+        headers["If-None-Match"] = manifest["etag"]
+    if manifest and manifest.get("last_modified"):
+        headers["If-Modified-Since"] = manifest["last_modified"]
+
+    try:
+        r = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+        r.raise_for_status()
+    except requests.RequestException:
+        if manifest:
+            return _read_version(feed, manifest, dtype)
+        raise
+
+    content_hash = hashlib.sha256(r.content).hexdigest()
+    if manifest and (
+        r.status_code == 304 or content_hash == manifest["content_hash"]
+    ):
+        manifest["fetched_at"] = time.time()
+        _write_manifest(feed, manifest)
+        return _read_version(feed, manifest, dtype)
+
+    df = pd.read_csv(
+        io.StringIO(r.text), header=None, names=columns, dtype=dtype)
+    write_snapshot(
+        feed,
+        df,
+        source=url,
+        content_hash=content_hash,
+        etag=r.headers.get("ETag"),
+        last_modified=r.headers.get("Last-Modified"),
+    )
+    return df
+
+
+def seed_snapshot(feed: str, csv_path: str) -> dict:
+    """
+    Write a local CSV with a header row (e.g. the repo's games.csv) as a
+    snapshot. It is marked stale, so it is revalidated on the next online
+    load and served as-is offline.
+    """
+    df = pd.read_csv(csv_path)
+    return write_snapshot(
+        feed, df, source=str(Path(csv_path).resolve()), fetched_at=0)
+
+
+if __name__ == "__main__":
+    # python snapshot.py games games.csv
+    feed, csv_path = sys.argv[1:3] if len(sys.argv) > 2 \
+        else ("games", "games.csv")
+    print(seed_snapshot(feed, csv_path))
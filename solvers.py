@@ -0,0 +1,282 @@
+import numpy as np
+
+
+def _game_entries(team_1_index, team_2_index, game_weights):
+    # COO triplets: each game adds its weight to both diagonal entries and
+    # subtracts it from the two off-diagonal entries.
+    rows = np.concatenate(
+        [team_1_index, team_2_index, team_1_index, team_2_index])
+    cols = np.concatenate(
+        [team_1_index, team_2_index, team_2_index, team_1_index])
+    data = np.concatenate(
+        [game_weights, game_weights, -game_weights, -game_weights])
+    return rows, cols, data
+
+
+class SparseSystem:
+    """
+    Symmetric team-by-team matrix stored in CSR form.
+
+    `ones_weight` adds a matrix-free `ones_weight * 11^T` term, which is how
+    the Massey sum-to-zero constraint is kept symmetric positive definite
+    without storing a dense row.
+    """
+
+    def __init__(
+            self,
+            num_teams: int,
+            indptr: np.ndarray,
+            indices: np.ndarray,
+            data: np.ndarray,
+            ones_weight: float = 0
+    ):
+        self.num_teams = num_teams
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.ones_weight = ones_weight
+
+        self.rows = np.repeat(
+            np.arange(num_teams, dtype=np.intp), np.diff(indptr))
+
+    @classmethod
+    def from_games(
+            cls,
+            num_teams: int,
+            team_1_index: np.ndarray,
+            team_2_index: np.ndarray,
+            game_weights: np.ndarray,
+            diagonal: float = 0,
+            ones_weight: float = 0
+    ) -> "SparseSystem":
+        n = num_teams
+        teams = np.arange(n, dtype=np.intp)
+        rows, cols, data = _game_entries(
+            team_1_index, team_2_index, game_weights)
+        return cls._from_entries(
+            n,
+            np.concatenate([teams, rows]),
+            np.concatenate([teams, cols]),
+            np.concatenate([np.full(n, diagonal, dtype=np.float64), data]),
+            ones_weight
+        )
+
+    def add_games(
+            self,
+            team_1_index: np.ndarray,
+            team_2_index: np.ndarray,
+            game_weights: np.ndarray
+    ) -> "SparseSystem":
+        """
+        A new system with more games merged into this one's entries, at the
+        cost of the entries already stored rather than of re-reading every
+        game behind them.
+        """
+        rows, cols, data = _game_entries(
+            team_1_index, team_2_index, game_weights)
+        return self._from_entries(
+            self.num_teams,
+            np.concatenate([self.rows, rows]),
+            np.concatenate([self.indices, cols]),
+            np.concatenate([self.data, data]),
+            self.ones_weight
+        )
+
+    @classmethod
+    def _from_entries(cls, n, rows, cols, data, ones_weight):
+        # Sum duplicate entries (teams that played more than once)
+        keys, inverse = np.unique(rows * n + cols, return_inverse=True)
+        data = np.bincount(inverse, weights=data, minlength=len(keys))
+        indptr = np.concatenate([
+            [0], np.cumsum(np.bincount(keys // n, minlength=n))
+        ]).astype(np.intp)
+
+        return cls(n, indptr, (keys % n).astype(np.intp), data, ones_weight)
+
+    def diagonal(self) -> np.ndarray:
+        on_diagonal = self.rows == self.indices
+        diag = np.bincount(
+            self.rows[on_diagonal],
+            weights=self.data[on_diagonal],
+            minlength=self.num_teams
+        )
+        return diag + self.ones_weight
+
+    def matvec(self, x: np.ndarray) -> np.ndarray:
+        y = np.bincount(
+            self.rows,
+            weights=self.data * x[self.indices],
+            minlength=self.num_teams
+        )
+        if self.ones_weight:
+            y += self.ones_weight * x.sum()
+        return y
+
+    def to_dense(self) -> np.ndarray:
+        matrix = np.full(
+            (self.num_teams, self.num_teams), float(self.ones_weight))
+        np.add.at(matrix, (self.rows, self.indices), self.data)
+        return matrix
+
+
+class DenseSystem:
+    """
+    A dense symmetric matrix in the interface conjugate_gradient expects,
+    for systems that are updated in place between solves.
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+        self.num_teams = len(matrix)
+
+    def diagonal(self) -> np.ndarray:
+        return np.diag(self.matrix).copy()
+
+    def matvec(self, x: np.ndarray) -> np.ndarray:
+        return self.matrix @ x
+
+
+class GameSystemBatch:
+    """
+    Stack of team-by-team systems that share one schedule but not the game
+    weights, e.g. one per RankingOptions scenario. Applied matrix-free to a
+    (scenarios, teams) array.
+    """
+
+    def __init__(
+            self,
+            num_teams: int,
+            team_1_index: np.ndarray,
+            team_2_index: np.ndarray,
+            game_weights: np.ndarray,
+            diagonal: float = 0,
+            ones_weight: float = 0
+    ):
+        self.num_teams = num_teams
+        self.num_scenarios = len(game_weights)
+        self.team_1_index = team_1_index
+        self.team_2_index = team_2_index
+        self.game_weights = game_weights
+        self.diagonal_value = diagonal
+        self.ones_weight = ones_weight
+
+        offsets = num_teams * np.arange(
+            self.num_scenarios, dtype=np.intp)[:, None]
+        self.flat_team_1_index = (offsets + team_1_index).ravel()
+        self.flat_team_2_index = (offsets + team_2_index).ravel()
+
+    def _scatter(self, flat_index: np.ndarray, values: np.ndarray):
+        return np.bincount(
+            flat_index,
+            weights=values.ravel(),
+            minlength=self.num_scenarios * self.num_teams
+        ).reshape(self.num_scenarios, self.num_teams)
+
+    def diagonal(self) -> np.ndarray:
+        return self.diagonal_value + self.ones_weight + self._scatter(
+            self.flat_team_1_index, self.game_weights
+        ) + self._scatter(self.flat_team_2_index, self.game_weights)
+
+    def matvec(self, x: np.ndarray) -> np.ndarray:
+        flow = self.game_weights * (
+            x[:, self.team_1_index] - x[:, self.team_2_index])
+        y = self.diagonal_value * x + self._scatter(
+            self.flat_team_1_index, flow
+        ) - self._scatter(self.flat_team_2_index, flow)
+        if self.ones_weight:
+            y += self.ones_weight * x.sum(axis=1, keepdims=True)
+        return y
+
+
+def conjugate_gradient(
+        matrix,
+        b: np.ndarray,
+        x0: np.ndarray = None,
+        tol: float = 1e-10,
+        max_iter: int = None
+) -> tuple[np.ndarray, int]:
+    """
+    Jacobi-preconditioned conjugate gradient for symmetric positive definite
+    systems. `b` is either one right-hand side or a (scenarios, teams) stack
+    solved together against a GameSystemBatch. Stops once every
+    ||b - Ax|| <= tol * ||b|| and returns the solution with the number of
+    iterations used.
+    """
+    if max_iter is None:
+        max_iter = 10 * matrix.num_teams
+
+    b = np.asarray(b, dtype=np.float64)
+    inv_diagonal = 1 / matrix.diagonal()
+    if b.ndim == 1:
+        return _conjugate_gradient_1d(
+            matrix, b, inv_diagonal, x0, tol, max_iter)
+    b_norm = np.linalg.norm(b, axis=-1)
+
+    x = np.zeros_like(b) if x0 is None else np.array(x0, dtype=np.float64)
+    residual = b - matrix.matvec(x)
+    z = inv_diagonal * residual
+    direction = z.copy()
+    rz = np.sum(residual * z, axis=-1)
+
+    for iteration in range(max_iter + 1):
+        # Systems that have converged keep their solution fixed while the
+        # rest of the batch continues.
+        active = np.linalg.norm(residual, axis=-1) > tol * b_norm
+        if not np.any(active):
+            return x, iteration
+        if iteration == max_iter:
+            break
+
+        a_direction = matrix.matvec(direction)
+        step = np.divide(
+            rz,
+            np.sum(direction * a_direction, axis=-1),
+            out=np.zeros_like(rz),
+            where=active
+        )
+        x += step[..., None] * direction
+        residual -= step[..., None] * a_direction
+
+        z = inv_diagonal * residual
+        rz_next = np.sum(residual * z, axis=-1)
+        beta = np.divide(
+            rz_next, rz, out=np.zeros_like(rz), where=active)
+        direction = z + beta[..., None] * direction
+        rz = rz_next
+
+    raise np.linalg.LinAlgError(
+        f"Conjugate gradient did not converge in {max_iter} iterations"
+    )
+
+
+def _conjugate_gradient_1d(matrix, b, inv_diagonal, x0, tol, max_iter):
+    # One right-hand side: the same iteration on scalars, without the batch
+    # masks, which cost more than the matvec on a season-sized system
+    tol_squared = tol * tol * np.dot(b, b)
+
+    x = np.zeros_like(b) if x0 is None else np.array(x0, dtype=np.float64)
+    residual = b - matrix.matvec(x)
+    z = inv_diagonal * residual
+    direction = z.copy()
+    rz = np.dot(residual, z)
+
+    for iteration in range(max_iter + 1):
+        if np.dot(residual, residual) <= tol_squared:
+            return x, iteration
+        if iteration == max_iter:
+            break
+
+        a_direction = matrix.matvec(direction)
+        step = rz / np.dot(direction, a_direction)
+        x += step * direction
+        residual -= step * a_direction
+
+        np.multiply(inv_diagonal, residual, out=z)
+        rz_next = np.dot(residual, z)
+        direction *= rz_next / rz
+        direction += z
+        rz = rz_next
+
+    raise np.linalg.LinAlgError(
+        f"Conjugate gradient did not converge in {max_iter} iterations"
+    )
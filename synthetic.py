@@ -0,0 +1,455 @@
+"""
+Synthetic seasons with known team strengths, written in the same formats as
+the real inputs: the headerless Massey teams/games feeds that get_teams and
+get_games read, and bracket tables/pages like get_bracket_games returns.
+
+    python synthetic.py out/ --teams 5000 --games-per-team 30 --seed 1
+    python synthetic.py out/ --install 2031   # also load_season(2031)
+"""
+import argparse
+import datetime
+import html
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+from bracket import BRACKET_CACHE_DIR, PLAY_IN_SEED_MAP, parse_bracket_html
+from data import GAMES_DTYPES, MASSEY_DAY_OFFSET, TEAMS_DTYPES, \
+    format_team_name
+from tournament import Tournament
+
+# Layout (game ids, regions, next-game links) of every generated bracket
+BRACKET_TEMPLATE = Path(__file__).resolve().parent / "bracket.csv"
+
+REGION_CODES = {
+    "South": "S",
+    "East": "E",
+    "Midwest": "MW",
+    "West": "W",
+}
+
+# Seeds of the two teams in each region's round-1 games, in game order
+FIRST_ROUND_SEEDS = [
+    (1, 16), (8, 9), (5, 12), (4, 13), (6, 11), (3, 14), (7, 10), (2, 15)]
+
+# Regions whose 16 seed (after a 1) or 11 seed (after a 6) is decided by a
+# First Four game, as in bracket.csv
+FIRST_FOUR_REGIONS = {
+    16: ["South", "East"],
+    11: ["Midwest", "West"],
+}
+
+
+class SyntheticSeason:
+    """
+    A generated season: `teams` and `games` are raw feed frames (as
+    load_feed returns them), `strengths` the true rating of each team in
+    teams order and `conferences` its conference number.
+    """
+
+    def __init__(
+            self,
+            teams: pd.DataFrame,
+            games: pd.DataFrame,
+            strengths: np.ndarray,
+            conferences: np.ndarray,
+            home_advantage: float,
+            noise: float,
+            seed: int = None
+    ):
+        self.teams = teams
+        self.games = games
+        self.strengths = strengths
+        self.conferences = conferences
+        self.home_advantage = home_advantage
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def ground_truth(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "team_id": self.teams["team_id"],
+            "team_name": self.teams["team_name"].map(format_team_name),
+            "conference": self.conferences,
+            "strength": self.strengths,
+        })
+
+
+def _game_rows(
+        rng: np.random.Generator,
+        strengths: np.ndarray,
+        team_1: np.ndarray,
+        team_2: np.ndarray,
+        team_1_homefield: np.ndarray,
+        days: np.ndarray,
+        home_advantage: float,
+        noise: float
+) -> pd.DataFrame:
+    # Scores from the margin the strengths predict plus normal noise; a
+    # tie goes to overtime and is won by one point.
+    margin = np.round(
+        strengths[team_1] - strengths[team_2]
+        + home_advantage * team_1_homefield
+        + rng.normal(0, noise, len(team_1))
+    ).astype(np.int64)
+    overtime = margin == 0
+    margin[overtime] = rng.choice([-1, 1], size=overtime.sum())
+    losing_score = rng.normal(66, 8, len(team_1)).round().astype(np.int64)
+
+    dates = [
+        datetime.date.fromordinal(int(day) - MASSEY_DAY_OFFSET)
+        for day in np.unique(days)
+    ]
+    yyyymmdd = dict(zip(
+        np.unique(days), [d.year * 10000 + d.month * 100 + d.day
+                          for d in dates]))
+
+    return pd.DataFrame({
+        "days_since_timestart": days,
+        "date": [yyyymmdd[day] for day in days],
+        "team_1_id": team_1 + 1,
+        "team_1_homefield": team_1_homefield,
+        "team_1_score": losing_score + np.maximum(margin, 0),
+        "team_2_id": team_2 + 1,
+        "team_2_homefield": -team_1_homefield,
+        "team_2_score": losing_score + np.maximum(-margin, 0),
+    }).astype(GAMES_DTYPES)
+
+
+def generate_season(
+        num_teams: int = 360,
+        games_per_team: float = 30,
+        conference_size: int = 12,
+        conference_game_fraction: float = 0.6,
+        neutral_fraction: float = 0.1,
+        home_advantage: float = 3.5,
+        conference_spread: float = 6,
+        team_spread: float = 8,
+        noise: float = 11,
+        season_days: int = 125,
+        first_day: datetime.date = datetime.date(2022, 11, 7),
+        seed: int = None
+) -> SyntheticSeason:
+    """
+    Teams are split into conferences of `conference_size`; a team's true
+    strength is its conference's level plus its own deviation. Games are
+    drawn at random, non-conference ones over the first part of the season
+    and conference ones (`conference_game_fraction` of all games) after.
+    A `neutral_fraction` of games are at neutral sites; in the rest team 1
+    is at home or away with equal chance.
+    """
+    rng = np.random.default_rng(seed)
+
+    conferences = np.arange(num_teams) // conference_size
+    num_conferences = conferences[-1] + 1
+    strengths = rng.normal(0, conference_spread, num_conferences)[
+        conferences] + rng.normal(0, team_spread, num_teams)
+
+    num_games = int(round(num_teams * games_per_team / 2))
+    num_conference = int(round(num_games * conference_game_fraction))
+    num_other = num_games - num_conference
+
+    # Non-conference: any two different teams
+    other_1 = rng.integers(0, num_teams, num_other)
+    other_2 = (other_1 + rng.integers(1, num_teams, num_other)) % num_teams
+
+    # Conference: a random other member of the same conference
+    conference_1 = rng.integers(0, num_teams, num_conference)
+    start = conferences[conference_1] * conference_size
+    size = np.minimum(conference_size, num_teams - start)
+    offset = conference_1 - start
+    conference_2 = start + (
+        offset + 1 + (rng.random(num_conference) * (size - 1)).astype(int)
+    ) % size
+    # A one-team conference (the last one, at most) plays anyone
+    alone = size == 1
+    conference_2[alone] = (conference_1[alone] + 1) % num_teams
+
+    team_1 = np.concatenate([other_1, conference_1])
+    team_2 = np.concatenate([other_2, conference_2])
+
+    split_day = int(season_days * (1 - conference_game_fraction))
+    days = np.concatenate([
+        rng.integers(0, max(split_day, 1), num_other),
+        rng.integers(split_day, season_days, num_conference),
+    ]) + first_day.toordinal() + MASSEY_DAY_OFFSET
+
+    team_1_homefield = np.where(
+        rng.random(num_games) < neutral_fraction,
+        0, rng.choice([1, -1], size=num_games))
+
+    order = np.argsort(days, kind="stable")
+    games = _game_rows(
+        rng,
+        strengths,
+        team_1[order],
+        team_2[order],
+        team_1_homefield[order],
+        days[order],
+        home_advantage,
+        noise
+    )
+
+    teams = pd.DataFrame({
+        "team_id": np.arange(1, num_teams + 1),
+        # Massey style: underscores for spaces, padded with spaces
+        "team_name": [f"  Synthetic_{i:05d}" for i in range(1, num_teams + 1)],
+    }).astype(TEAMS_DTYPES)
+
+    return SyntheticSeason(
+        teams, games, strengths, conferences, home_advantage, noise,
+        seed=None if seed is None else seed + 1
+    )
+
+
+def render_bracket_html(bracket: pd.DataFrame) -> str:
+    """
+    An NCAA-style bracket page for a bracket frame (e.g. bracket.csv), in
+    the markup parse_bracket_html reads. A first-round "A/B" team becomes a
+    First Four game; a first-round game missing its second team gets a
+    First Four game between two placeholder teams.
+    """
+    def team(seed, name) -> str:
+        seed = "" if pd.isna(seed) else str(int(seed))
+        name = "" if pd.isna(name) else html.escape(name)
+        return (
+            f'<div class="team"><span class="overline">{seed}</span>'
+            f'<p class="body">{name}</p></div>'
+        )
+
+    def pod(row) -> str:
+        teams = [(None, None), (None, None)]
+        if row["round"] == 1:
+            teams = [
+                (row[f"team_{spot}_seed"], row[f"team_{spot}_name"])
+                for spot in (1, 2)
+            ]
+            if isinstance(teams[1][1], str) and "/" in teams[1][1]:
+                teams[1] = (None, None)
+        return (
+            f'<a class="game-pod" id="{row["id"]}">'
+            + "".join(team(*t) for t in teams)
+            + "</a>"
+        )
+
+    parts = ["<html><body>"]
+    for region in REGION_CODES:
+        parts.append(
+            f'<div class="region"><span class="subtitle">{region}</span>')
+        for r in range(1, 5):
+            games = bracket[
+                (bracket["region_name"] == region) & (bracket["round"] == r)]
+            parts.append(
+                f'<div class="region-round round-{r}">'
+                + "".join(pod(row) for _, row in games.iterrows())
+                + "</div>"
+            )
+        parts.append("</div>")
+
+    parts.append('<div class="final-four">')
+    for _, row in bracket[bracket["round"] >= 5].iterrows():
+        parts.append(pod(row))
+    parts.append("</div>")
+
+    parts.append('<div class="first-four">')
+    first_round = bracket[bracket["round"] == 1]
+    play_ins = first_round[
+        first_round["team_2_name"].isna()
+        | first_round["team_2_name"].str.contains("/", na=False)
+    ]
+    for _, row in play_ins.iterrows():
+        code = REGION_CODES[row["region_name"]]
+        seed = PLAY_IN_SEED_MAP[str(int(row["team_1_seed"]))]
+        names = row["team_2_name"].split("/") \
+            if isinstance(row["team_2_name"], str) \
+            else [f"{code} {seed} play-in {side}" for side in "AB"]
+        parts.append(
+            '<div class="game-pod">'
+            f'<span class="subtitle">{code}</span>'
+            f'<span class="overline">{seed}</span>'
+            + "".join(
+                f'<div class="team"><p class="body">{html.escape(name)}'
+                '</p></div>'
+                for name in names
+            )
+            + "</div>"
+        )
+    parts.append("</div></body></html>")
+    return "".join(parts)
+
+
+def generate_bracket(
+        season: SyntheticSeason,
+        selection_noise: float = 2
+) -> pd.DataFrame:
+    """
+    Seed the 68 best teams (by strength plus `selection_noise`) into the
+    bracket.csv layout, S-curve style, with First Four games for two
+    16 lines and two 11 lines. Returns the frame parse_bracket_html gives
+    for the rendered page, so it matches get_bracket_games exactly.
+    """
+    names = season.teams["team_name"].map(format_team_name).to_numpy()
+    perceived = season.strengths + season.rng.normal(
+        0, selection_noise, len(season.strengths))
+    field = names[np.argsort(-perceived)[:68]]
+
+    regions = list(REGION_CODES)
+    lines = {}
+    position = 0
+    for seed in range(1, 17):
+        count = 4 + 2 * (seed in FIRST_FOUR_REGIONS)
+        teams = list(field[position:position + count])
+        position += count
+
+        # Serpentine across regions; the First Four pairs go last
+        order = regions if seed % 2 else regions[::-1]
+        play_in_regions = FIRST_FOUR_REGIONS.get(seed, [])
+        direct = [r for r in order if r not in play_in_regions]
+        lines[seed] = dict(zip(direct, teams))
+        for k, region in enumerate(play_in_regions):
+            pair = teams[len(direct) + 2 * k:len(direct) + 2 * k + 2]
+            lines[seed][region] = "/".join(pair)
+
+    bracket = pd.read_csv(BRACKET_TEMPLATE)
+    first_round = bracket["round"] == 1
+    for i in np.flatnonzero(first_round):
+        region = bracket.at[i, "region_name"]
+        seeds = FIRST_ROUND_SEEDS[bracket.at[i, "round_game_number"] - 1]
+        for spot, seed in enumerate(seeds, start=1):
+            bracket.at[i, f"team_{spot}_seed"] = seed
+            bracket.at[i, f"team_{spot}_name"] = lines[seed][region]
+
+    return parse_bracket_html(render_bracket_html(bracket))
+
+
+def play_tournament(
+        season: SyntheticSeason,
+        bracket: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Play the bracket with the true strengths on neutral courts and return
+    the games in the raw feed format, dated after the regular season.
+    """
+    tournament = Tournament(bracket)
+    names = season.teams["team_name"].map(format_team_name)
+    team_of = dict(zip(names, range(len(names))))
+    field = np.array([team_of[name] for name in tournament.teams])
+
+    slots = tournament.slots.copy()
+    first_day = season.games["days_since_timestart"].max() + 2
+    rounds = []
+    for k, games in enumerate(tournament.round_games):
+        team_1 = field[slots[games, 0]]
+        team_2 = field[slots[games, 1]]
+        rows = _game_rows(
+            season.rng,
+            season.strengths,
+            team_1,
+            team_2,
+            np.zeros(len(games), dtype=np.int64),
+            np.full(len(games), first_day + 2 * k),
+            season.home_advantage,
+            season.noise
+        )
+        rounds.append(rows)
+
+        team_1_win = rows["team_1_score"].to_numpy() \
+            > rows["team_2_score"].to_numpy()
+        winners = np.where(team_1_win, slots[games, 0], slots[games, 1])
+        next_game = tournament.next_game[games]
+        advancing = next_game >= 0
+        slots[next_game[advancing], tournament.next_spot[games][advancing]] \
+            = winners[advancing]
+
+    return pd.concat(rounds, ignore_index=True)
+
+
+def write_season(
+        season: SyntheticSeason,
+        directory: Path,
+        with_tournament: bool = True
+) -> dict[str, Path]:
+    """
+    Write teams.csv and games.csv in the headerless feed format, the
+    bracket as bracket.csv and bracket.html, and the true strengths as
+    strengths.csv. With `with_tournament`, games.csv includes the
+    tournament games.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    bracket = generate_bracket(season)
+    games = season.games
+    if with_tournament:
+        games = pd.concat(
+            [games, play_tournament(season, bracket)], ignore_index=True)
+
+    paths = {
+        name: directory / file_name
+        for name, file_name in [
+            ("teams", "teams.csv"),
+            ("games", "games.csv"),
+            ("bracket", "bracket.csv"),
+            ("bracket_html", "bracket.html"),
+            ("strengths", "strengths.csv"),
+        ]
+    }
+    season.teams.to_csv(paths["teams"], header=False, index=False)
+    games.to_csv(paths["games"], header=False, index=False)
+    bracket.to_csv(paths["bracket"], index=False)
+    paths["bracket_html"].write_text(render_bracket_html(bracket))
+    season.ground_truth.to_csv(paths["strengths"], index=False)
+    return paths
+
+
+def install_season(paths: dict[str, Path], year: int):
+    """
+    Make written season files the local snapshots for `year`, so
+    data.load_season(year) and the backtest read them offline.
+    """
+    for feed, columns in (("teams", TEAMS_DTYPES), ("games", GAMES_DTYPES)):
+        df = pd.read_csv(
+            paths[feed], header=None, names=list(columns), dtype=columns)
+        snapshot.write_snapshot(f"{feed}_{year}", df, source=str(paths[feed]))
+
+    BRACKET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    (BRACKET_CACHE_DIR / f"{year}.html").write_text(
+        paths["bracket_html"].read_text())
+
+
+def rank_correlation(ratings: np.ndarray, strengths: np.ndarray) -> float:
+    """
+    Spearman correlation between computed ratings and true strengths.
+    """
+    rating_ranks = np.argsort(np.argsort(ratings))
+    strength_ranks = np.argsort(np.argsort(strengths))
+    return float(np.corrcoef(rating_ranks, strength_ranks)[0, 1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--teams", type=int, default=360)
+    parser.add_argument("--games-per-team", type=float, default=30)
+    parser.add_argument("--conference-size", type=int, default=12)
+    parser.add_argument("--neutral-fraction", type=float, default=0.1)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--install", type=int, metavar="YEAR",
+        help="also install the files as the local snapshots for YEAR")
+    args = parser.parse_args()
+
+    season = generate_season(
+        num_teams=args.teams,
+        games_per_team=args.games_per_team,
+        conference_size=args.conference_size,
+        neutral_fraction=args.neutral_fraction,
+        seed=args.seed,
+    )
+    paths = write_season(season, args.directory)
+    if args.install:
+        install_season(paths, args.install)
+    for path in paths.values():
+        print(path)
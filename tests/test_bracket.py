@@ -0,0 +1,161 @@
+import io
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import requests
+
+import bracket
+import snapshot
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+REPO = Path(__file__).resolve().parent.parent
+
+
+# bracket.csv rendered by synthetic.render_bracket_html with the 2023 First
+# Four filled in: it pins the parser's output, not ncaa.com's markup
+RENDERED = FIXTURES / "bracket_2023_rendered.html"
+
+# A real page saved by `python bracket.py fixture 2023`
+NCAA_PAGE = FIXTURES / "ncaa_bracket_2023.html"
+
+
+def test_parse_rendered_bracket_matches_saved_bracket():
+    parsed = bracket.parse_bracket_html(RENDERED.read_text(encoding="utf-8"))
+    # Round-trip as get_bracket_games(save_to_file=True) writes bracket.csv.
+    # That file was saved before the First Four teams were posted ...
+    parsed = pd.read_csv(io.StringIO(parsed.to_csv(index=False)))
+    expected = pd.read_csv(REPO / "bracket.csv")
+    # ... and before the title game was labelled on its own
+    expected.loc[expected["id"] == 701, "region_name"] = "CHAMPIONSHIP"
+
+    first_four = parsed["team_2_name"].str.contains("/", na=False)
+    assert parsed.loc[first_four, "team_2_name"].tolist() == [
+        "Texas A&M-CC/SE Missouri St.",
+        "Mississippi St./Pitt",
+        "Texas Southern/F. Dickinson",
+        "Arizona St./Nevada",
+    ]
+    assert parsed.loc[first_four, "team_2_seed"].tolist() == [16, 11, 16, 11]
+
+    columns = ["team_2_seed", "team_2_name"]
+    pd.testing.assert_frame_equal(
+        parsed.drop(columns=columns),
+        expected.drop(columns=columns),
+        check_dtype=False,
+    )
+    pd.testing.assert_frame_equal(
+        parsed.loc[~first_four, columns],
+        expected.loc[~first_four, columns],
+        check_dtype=False,
+    )
+
+
+def test_trim_keeps_what_the_parser_reads():
+    body = RENDERED.read_text(encoding="utf-8")
+    page = (
+        '<html><head><script>var pod = "<div class=\\"region\\">";</script>'
+        '</head><body><nav><div class="menu"><div class="team">'
+        '<span class="overline">Menu</span></div></div></nav>'
+        + body.replace("<html><body>", "").replace("</body></html>", "")
+        + '<footer><div class="footer"><p class="body">x</p></div></footer>'
+        '</body></html>'
+    )
+    trimmed = bracket.trim_bracket_html(page)
+
+    assert len(trimmed) < len(page)
+    expected = bracket.parse_bracket_html(body)
+    pd.testing.assert_frame_equal(bracket.parse_bracket_html(page), expected)
+    pd.testing.assert_frame_equal(
+        bracket.parse_bracket_html(trimmed), expected)
+
+
+@pytest.mark.skipif(
+    not NCAA_PAGE.exists(),
+    reason="no saved ncaa.com page; `python bracket.py fixture 2023`")
+def test_parse_saved_ncaa_page():
+    parsed = bracket.parse_bracket_html(
+        NCAA_PAGE.read_text(encoding="utf-8"))
+    expected = pd.read_csv(REPO / "bracket.csv")
+
+    assert len(parsed) == 63
+    assert parsed["id"].tolist() == expected["id"].tolist()
+    assert parsed["team_2_name"].str.contains("/", na=False).sum() <= 4
+    first_round = parsed[parsed["round"] == 1]
+    assert sorted(first_round["team_1_seed"]) == sorted(list(range(1, 9)) * 4)
+    known = expected["team_1_name"].notna()
+    assert parsed.loc[known, "team_1_name"].tolist() \
+        == expected.loc[known, "team_1_name"].tolist()
+
+
+class FakeSession:
+    def __init__(self, text="<html>new</html>", error=None):
+        self.text = text
+        self.error = error
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def saved_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr(bracket, "BRACKET_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(snapshot, "OFFLINE", False)
+
+    def save(url, age):
+        path = bracket._cache_path(url)
+        path.write_text("<html>saved</html>", encoding="utf-8")
+        fetched_at = time.time() - age
+        os.utime(path, (fetched_at, fetched_at))
+
+    return save
+
+
+def use_session(monkeypatch, session):
+    monkeypatch.setattr(bracket, "_get_session", lambda: session)
+    return session
+
+
+def test_fresh_current_page_is_served_from_disk(saved_pages, monkeypatch):
+    session = use_session(monkeypatch, FakeSession())
+    saved_pages(bracket.BRACKET_URL, age=60)
+
+    assert bracket.fetch_bracket_html() == "<html>saved</html>"
+    assert session.urls == []
+
+
+def test_stale_current_page_is_fetched_again(saved_pages, monkeypatch):
+    session = use_session(monkeypatch, FakeSession())
+    saved_pages(bracket.BRACKET_URL, age=bracket.BRACKET_TTL_SECONDS + 60)
+
+    assert bracket.fetch_bracket_html() == "<html>new</html>"
+    assert session.urls == [bracket.BRACKET_URL]
+    assert bracket._cache_path(bracket.BRACKET_URL).read_text(
+        encoding="utf-8") == "<html>new</html>"
+
+
+def test_past_year_page_is_kept(saved_pages, monkeypatch):
+    session = use_session(monkeypatch, FakeSession())
+    saved_pages(bracket.BRACKET_URL_2022, age=365 * 24 * 60 * 60)
+
+    assert bracket.fetch_bracket_html(bracket.BRACKET_URL_2022) \
+        == "<html>saved</html>"
+    assert session.urls == []
+
+
+def test_refresh_falls_back_to_saved_page(saved_pages, monkeypatch):
+    session = use_session(
+        monkeypatch, FakeSession(error=requests.ConnectionError()))
+    saved_pages(bracket.BRACKET_URL, age=60)
+
+    assert bracket.fetch_bracket_html(refresh=True) == "<html>saved</html>"
+    assert session.urls == [bracket.BRACKET_URL]
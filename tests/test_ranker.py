@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import compact_games, prepare_games, prepare_teams
+from ranker import RANKERS, BradleyTerryRanker, EloRanker, RankingOptions
+from synthetic import generate_season
+
+
+@pytest.fixture(scope="module")
+def season():
+    synthetic = generate_season(num_teams=40, games_per_team=12, seed=0)
+    teams = prepare_teams(synthetic.teams)
+    return compact_games(prepare_games(synthetic.games), teams), teams
+
+
+def test_prepare_games_keeps_away_games(season):
+    games, _ = season
+    assert set(games["team_1_homefield"]) == {-1, 0, 1}
+    assert (games["team_1_homefield"] == -games["team_2_homefield"]).all()
+
+
+@pytest.mark.parametrize("method", list(RANKERS))
+def test_away_win_weight_changes_ratings(season, method):
+    games, teams = season
+    ranker = RANKERS[method](games, teams, RankingOptions())
+    assert (ranker.winner_location == 1).any()
+
+    even, away = ranker.process_batch([
+        RankingOptions(), RankingOptions(weight_away_win=0.5)])
+    assert not np.allclose(even, away)
+
+
+def one_game(winner_homefield: int):
+    # Team 1 beats team 2 by 5, at home (1), away (-1) or on a neutral court
+    teams = prepare_teams(pd.DataFrame({
+        "team_id": [1, 2], "team_name": ["Home", "Away"]}))
+    games = prepare_games(pd.DataFrame({
+        "days_since_timestart": [738950],
+        "date": [20230101],
+        "team_1_id": [1],
+        "team_1_homefield": [winner_homefield],
+        "team_1_score": [70],
+        "team_2_id": [2],
+        "team_2_homefield": [-winner_homefield],
+        "team_2_score": [65],
+    }))
+    return compact_games(games, teams), teams
+
+
+def elo_gain(winner_homefield: int, home_advantage: float) -> float:
+    ranker = EloRanker(
+        *one_game(winner_homefield), RankingOptions(),
+        home_advantage=home_advantage)
+    ratings = ranker.process().ratings
+    assert ratings[0] - 1500 == pytest.approx(1500 - ratings[1])
+    return ratings[0] - 1500
+
+
+def test_elo_home_advantage_is_symmetric():
+    home_win, away_win = elo_gain(1, 100), elo_gain(-1, 100)
+    # The home bonus is charged against a road winner as much as it is
+    # credited to a home winner
+    assert away_win > elo_gain(0, 100) > home_win
+    assert away_win == pytest.approx(elo_gain(1, -100))
+    assert home_win == pytest.approx(elo_gain(-1, -100))
+    assert elo_gain(1, 0) == elo_gain(-1, 0) == elo_gain(0, 0)
+
+
+def test_bradley_terry_ignores_warm_start_of_another_size(season):
+    games, teams = season
+    cold = BradleyTerryRanker(games, teams, RankingOptions()).process()
+    warm = BradleyTerryRanker(
+        games, teams, RankingOptions(), warm_start=np.ones(len(teams) + 5)
+    ).process()
+    np.testing.assert_allclose(warm.ratings, cold.ratings, atol=1e-9)
+
+
+@pytest.mark.parametrize("method", ["Colley", "Massey"])
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_add_games_matches_a_full_solve(season, method, solver):
+    games, teams = season
+    options = RankingOptions(segment_weights=[0.5, 1.0, 1.5])
+    days = games["days_since_timestart"]
+    cutoff = days.quantile(0.7)
+    ranker = RANKERS[method](
+        games[days <= cutoff].reset_index(drop=True), teams, options,
+        solver=solver, season_end=days.max())
+    ranker.process()
+
+    late = games[days > cutoff]
+    for _, day in late.groupby("days_since_timestart"):
+        ranker.add_games(day, refresh_every=len(games))
+    # Every late game went through the update, not a rebuild
+    assert ranker._incremental["pending_games"] == len(late)
+
+    full = RANKERS[method](
+        games, teams, options, solver="dense", season_end=days.max())
+    np.testing.assert_allclose(
+        ranker.add_games(late[:0]), full.process().ratings,
+        rtol=0, atol=1e-8)
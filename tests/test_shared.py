@@ -0,0 +1,50 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import bracket
+import shared
+
+pytest.importorskip("pyarrow")
+
+RENDERED = Path(__file__).resolve().parent / "fixtures" \
+    / "bracket_2023_rendered.html"
+
+
+@pytest.fixture(scope="module")
+def season():
+    games = pd.DataFrame({
+        "day": [738950, 738951],
+        "team_1_index": [0, 1],
+        "team_2_index": [1, 0],
+    })
+    teams = pd.DataFrame({"team_id": [1, 2], "team_name": ["A", "B"]})
+    parsed = bracket.parse_bracket_html(RENDERED.read_text(encoding="utf-8"))
+    return games, teams, parsed
+
+
+def test_season_version_covers_teams_and_bracket(season):
+    games, teams, parsed = season
+    version = shared.season_version(games, teams, parsed)
+
+    renamed = teams.assign(team_name=["A", "C"])
+    moved = parsed.copy()
+    moved.loc[0, "team_1_name"] = "Somebody Else"
+
+    assert shared.season_version(games, teams, parsed) == version
+    assert shared.season_version(games, renamed, parsed) != version
+    assert shared.season_version(games, teams, moved) != version
+    assert shared.season_version(games, teams) != version
+
+
+def test_published_bracket_keeps_next_game_id(season, tmp_path):
+    games, teams, parsed = season
+    path = shared.publish(
+        games, teams, shared.season_version(games, teams, parsed),
+        bracket=parsed, directory=tmp_path)
+
+    published = shared.PublishedSeason(path).bracket
+    assert published["next_game_id"].dtype == "Int64"
+    assert published["next_game_id"].tolist() \
+        == parsed["next_game_id"].astype("Int64").tolist()
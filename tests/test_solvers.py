@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from data import compact_games, prepare_games, prepare_teams
+from ranker import ColleyRanker, MasseyRanker, RankingOptions
+from solvers import SparseSystem, conjugate_gradient
+from synthetic import generate_season
+
+
+@pytest.fixture(scope="module")
+def season():
+    synthetic = generate_season(num_teams=40, games_per_team=12, seed=1)
+    teams = prepare_teams(synthetic.teams)
+    return compact_games(prepare_games(synthetic.games), teams), teams
+
+
+@pytest.mark.parametrize("ones_weight", [0, 1])
+def test_conjugate_gradient_matches_dense_solve(ones_weight):
+    rng = np.random.default_rng(0)
+    n = 30
+    team_1, team_2 = rng.integers(n, size=(2, 200))
+    keep = team_1 != team_2
+    system = SparseSystem.from_games(
+        n, team_1[keep], team_2[keep], rng.uniform(0.5, 2, keep.sum()),
+        diagonal=2 - 2 * ones_weight, ones_weight=ones_weight)
+    b = rng.normal(size=n)
+
+    x, _ = conjugate_gradient(system, b, tol=1e-12)
+    np.testing.assert_allclose(
+        x, np.linalg.solve(system.to_dense(), b), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("cls", [ColleyRanker, MasseyRanker])
+def test_sparse_solver_matches_dense_solver(season, cls):
+    games, teams = season
+    options = RankingOptions(
+        weight_home_win=0.8, segment_weights=[0.5, 1.0, 1.5])
+
+    dense = cls(games, teams, options, solver="dense").process()
+    sparse = cls(games, teams, options, solver="sparse").process()
+    np.testing.assert_allclose(
+        sparse.ratings, dense.ratings, rtol=0, atol=1e-8)
+
+    scenarios = [options, RankingOptions(weight_away_win=1.4)]
+    np.testing.assert_allclose(
+        cls(games, teams, options, solver="sparse").process_batch(scenarios),
+        cls(games, teams, options, solver="dense").process_batch(scenarios),
+        rtol=0, atol=1e-8)
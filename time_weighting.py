@@ -1,6 +1,76 @@
-import streamlit as st
+import numpy as np
 import pandas as pd
-from data import get_data
+from cache import cache_resource
+from data import game_dates, get_data, get_data_version
+from decay import ExponentialDecay, LinearRamp
+from instrumentation import cached
+
+# Weight vectors kept per process; every distinct slider or table schedule
+# from any session adds one
+TIME_WEIGHTS_CACHE_SIZE = 64
+
+
+class SeasonCalendar:
+    """
+    Season bounds of the games get_data serves: first and last dates, and
+    how far through the season each game was played (as the rankers
+    measure it).
+    """
+
+    def __init__(self, games: pd.DataFrame):
+        days = games["days_since_timestart"].to_numpy()
+        self.first_date, self.last_date = game_dates([days.min(), days.max()])
+        self.day_before_season = days[0] - 1
+        self.last_day = days[-1]
+        self.season_fraction = (days - self.day_before_season) \
+            / (self.last_day - self.day_before_season)
+        self.season_fraction.setflags(write=False)
+        self._segments = {}
+
+    def segment_bounds(self, num_segments: int) -> pd.DataFrame:
+        """
+        First and last date of each of num_segments equal time segments,
+        formatted for display ("Mon, Mar 3").
+        """
+        if num_segments not in self._segments:
+            timespan = (self.last_date - self.first_date).days / num_segments
+            offsets = pd.to_timedelta(
+                np.arange(num_segments + 1) * timespan, unit="D")
+            start_date = self.first_date + offsets[:-1]
+            # Don't let end date be the same as next start date
+            end_date = (self.first_date + offsets[1:]).to_series()
+            end_date.iloc[:-1] -= pd.Timedelta(days=1)
+
+            self._segments[num_segments] = pd.DataFrame({
+                "start_date": start_date.strftime("%a, %b %-d"),
+                "end_date": end_date.dt.strftime("%a, %b %-d").to_numpy(),
+            })
+        return self._segments[num_segments]
+
+
+@cached(cache_resource)
+def _season_calendar(data_version: str) -> SeasonCalendar:
+    return SeasonCalendar(get_data())
+
+
+def get_season_calendar() -> SeasonCalendar:
+    return _season_calendar(get_data_version())
+
+
+@cached(cache_resource(max_entries=TIME_WEIGHTS_CACHE_SIZE))
+def _time_weights(data_version: str, schedule) -> np.ndarray:
+    weights = schedule(_season_calendar(data_version).season_fraction)
+    weights.setflags(write=False)
+    return weights
+
+
+def get_time_weights(schedule) -> np.ndarray:
+    """
+    Weight of every game in get_data under a decay.py schedule, computed
+    once per data snapshot and schedule and kept for the
+    TIME_WEIGHTS_CACHE_SIZE most recently used. Read-only.
+    """
+    return _time_weights(get_data_version(), schedule)
 
 
 # We want to stream a editable dataframe that allows the user to input weights for spans of time
@@ -10,30 +80,36 @@ from data import get_data
 # they will be able to input the weight for each time weight.
 
 
-def input_time_weights(parent=st):
-    data = get_data()
-    min_date = data["date"].min()
-    max_date = data["date"].max()
+def input_time_weights(parent=None):
+    if parent is None:
+        import streamlit as st
+        parent = st
 
     number_of_weights = parent.number_input(
         "Num of time weights", value=2, min_value=1, max_value=20)
 
-    timespan = (max_date - min_date).days / int(number_of_weights)
-
-    df = pd.DataFrame(columns=["start_date", "end_date", "weight"])
-    for i in range(int(number_of_weights)):
+    df = get_season_calendar().segment_bounds(int(number_of_weights)) \
+        .assign(weight=1.0)
 
-        start_date = min_date + pd.Timedelta(days=i*timespan)
-        end_date = min_date + pd.Timedelta(days=(i+1)*timespan)
+    return parent.experimental_data_editor(df)
 
-        # Don't let end date be the same as next start date
-        if i < int(number_of_weights) - 1:
-            end_date -= pd.Timedelta(days=1)
 
-        df.loc[i] = [start_date, end_date, 1.0]
+def input_time_decay(kind: str, parent=None):
+    # Sliders for the continuous schedules in decay.py
+    if parent is None:
+        import streamlit as st
+        parent = st
 
-    # Format date columns as "Mon, Mar 3"
-    df["start_date"] = df["start_date"].dt.strftime("%a, %b %-d")
-    df["end_date"] = df["end_date"].dt.strftime("%a, %b %-d")
+    if kind == "Exponential decay":
+        half_life = parent.slider(
+            "Half-life (fraction of the season)",
+            value=0.25, min_value=0.05, max_value=1.0, step=0.05,
+            help="A game this far before the end of the season counts half "
+                 "as much as one played on the last day.")
+        return ExponentialDecay(half_life)
 
-    return parent.experimental_data_editor(df)
+    start = parent.slider(
+        "Weight at the start of the season",
+        value=0.5, min_value=0.0, max_value=2.0, step=0.05,
+        help="Rises in a straight line to 1 on the last day.")
+    return LinearRamp(start, 1.0)
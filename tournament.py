@@ -0,0 +1,193 @@
+import pandas as pd
+import numpy as np
+from ranker import RatingsResult
+from registry import TeamRegistry
+
+# Regions whose Elite Eight winner takes the first spot in its Final Four game
+FINAL_FOUR_FIRST_SPOT_REGIONS = ["South", "Midwest"]
+
+
+class Tournament:
+    """
+    A bracket from get_bracket_games flattened into integer arrays.
+
+    Teams are numbered by first appearance in round 1; play-in ("A/B") slots
+    become extra round-0 games that feed the round-1 game they sit in.
+    Game `g` starts with `slots[g]` (team indices, -1 when filled by an
+    earlier game) and its winner moves to `slots[next_game[g],
+    next_spot[g]]`.
+
+    With a TeamRegistry, every bracket name is resolved once and
+    `registry_index` maps tournament team index -> registry index.
+    """
+
+    def __init__(self, bracket: pd.DataFrame, registry: TeamRegistry = None):
+        bracket = bracket.reset_index(drop=True)
+        num_bracket_games = len(bracket)
+        self.bracket = bracket
+        self.registry = registry
+
+        self.teams = []
+        self.seeds = []
+        self.team_index = {}
+
+        game_round = bracket["round"].to_numpy(dtype=np.intp)
+        next_game = bracket["next_game_index"].fillna(-1)\
+            .to_numpy(dtype=np.intp)
+        next_spot = np.where(
+            bracket["round_game_number"].to_numpy() % 2 == 1, 0, 1)
+        next_spot = np.where(
+            bracket["next_round"].to_numpy() == 5,
+            np.where(
+                bracket["region_name"].isin(FINAL_FOUR_FIRST_SPOT_REGIONS),
+                0, 1),
+            next_spot
+        )
+
+        slots = np.full((num_bracket_games, 2), -1, dtype=np.intp)
+        play_in_slots = []
+        play_in_next = []
+
+        first_round = bracket[bracket["round"] == 1]
+        for g, *row in zip(
+            first_round.index,
+            first_round["team_1_name"],
+            first_round["team_1_seed"],
+            first_round["team_2_name"],
+            first_round["team_2_seed"],
+        ):
+            for spot in range(2):
+                name, seed = row[2 * spot], row[2 * spot + 1]
+                if not isinstance(name, str) or not name:
+                    raise ValueError(
+                        f"Bracket game {g} has no team in spot {spot + 1}")
+
+                if "/" in name:
+                    play_in_slots.append([
+                        self._add_team(team, seed)
+                        for team in name.split("/")
+                    ])
+                    play_in_next.append((g, spot))
+                else:
+                    slots[g, spot] = self._add_team(name, seed)
+
+        num_play_in = len(play_in_slots)
+        self.num_bracket_games = num_bracket_games
+        self.num_games = num_bracket_games + num_play_in
+        self.slots = np.concatenate([
+            slots,
+            np.array(play_in_slots, dtype=np.intp).reshape(num_play_in, 2)
+        ])
+        self.next_game = np.concatenate([
+            next_game,
+            np.array([g for g, _ in play_in_next], dtype=np.intp)
+        ])
+        self.next_spot = np.concatenate([
+            next_spot,
+            np.array([spot for _, spot in play_in_next], dtype=np.intp)
+        ])
+        self.round = np.concatenate([
+            game_round, np.zeros(num_play_in, dtype=np.intp)])
+
+        # Games grouped by round; every game in a round can be resolved at
+        # once because its inputs all come from earlier rounds.
+        self.rounds = np.unique(self.round)
+        self.round_games = [
+            np.flatnonzero(self.round == r) for r in self.rounds]
+        self.seeds = np.array(self.seeds, dtype=np.float64)
+        if registry is not None:
+            self.registry_index = registry.indices(self.teams)
+
+    def _add_team(self, name: str, seed) -> int:
+        name = name.strip()
+        if name not in self.team_index:
+            self.team_index[name] = len(self.teams)
+            self.teams.append(name)
+            self.seeds.append(seed)
+        return self.team_index[name]
+
+    @property
+    def num_teams(self) -> int:
+        return len(self.teams)
+
+    def team_ratings(self, ratings) -> np.ndarray:
+        """
+        Ratings for the tournament field, in team index order, from a
+        RatingsResult, a ratings array in registry index order or a
+        rankings frame with "team" and "rating" columns.
+        """
+        if isinstance(ratings, RatingsResult):
+            if ratings.registry is self.registry:
+                return ratings.ratings[self.registry_index]
+            return ratings.rating_of(self.teams)
+
+        if isinstance(ratings, np.ndarray):
+            return ratings[self.registry_index]
+
+        if self.registry is not None:
+            by_index = np.full(len(self.registry), np.nan)
+            by_index[self.registry.indices(ratings["team"])] = \
+                ratings["rating"].to_numpy(dtype=np.float64)
+            return by_index[self.registry_index]
+
+        by_name = pd.Series(
+            ratings["rating"].to_numpy(dtype=np.float64),
+            index=ratings["team"]
+        )
+        field_ratings = by_name.reindex(self.teams).to_numpy()
+
+        missing = [
+            team for team, rating in zip(self.teams, field_ratings)
+            if np.isnan(rating)
+        ]
+        if missing:
+            raise ValueError(f"No rating for {', '.join(missing)}")
+        return field_ratings
+
+    def play(self, ratings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Pick the higher-rated team in every game. Returns the filled
+        (games, 2) slot array and the winning spot (0 or 1) of each game.
+        """
+        slots = self.slots.copy()
+        winner_spot = np.empty(self.num_games, dtype=np.intp)
+
+        for games in self.round_games:
+            team_a = slots[games, 0]
+            team_b = slots[games, 1]
+            spot = np.where(ratings[team_a] > ratings[team_b], 0, 1)
+            winner_spot[games] = spot
+
+            next_game = self.next_game[games]
+            advancing = next_game >= 0
+            slots[
+                next_game[advancing], self.next_spot[games][advancing]
+            ] = slots[games, spot][advancing]
+
+        return slots, winner_spot
+
+    def to_frame(
+            self,
+            slots: np.ndarray,
+            winner_spot: np.ndarray
+    ) -> pd.DataFrame:
+        """
+        The original bracket frame with later-round teams and every game's
+        winner filled in from the result of play().
+        """
+        frame = self.bracket.copy()
+        n = self.num_bracket_games
+        later_round = frame["round"].to_numpy() != 1
+        team_names = np.array(self.teams, dtype=object)
+
+        for spot in range(2):
+            teams = slots[:n, spot][later_round]
+            frame.loc[later_round, f"team_{spot + 1}_seed"] = \
+                self.seeds[teams]
+            frame.loc[later_round, f"team_{spot + 1}_name"] = \
+                team_names[teams]
+            frame[f"team_{spot + 1}_seed"] = pd.to_numeric(
+                frame[f"team_{spot + 1}_seed"]).astype("Int64")
+            frame[f"team_{spot + 1}_win"] = winner_spot[:n] == spot
+
+        return frame
@@ -0,0 +1,291 @@
+"""
+Search the ranking weights (home/away/neutral win weights and time segment
+weights) for the configuration that best predicts held-out games.
+
+The season is split in time: ratings are computed from the earlier games
+and scored on how many of the later games they pick correctly.
+
+    python tuning.py random --method Massey --candidates 2000 --segments 3
+"""
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data import CURRENT_SEASON, load_season
+from ranker import RANKERS, RankingOptions
+
+# Same range as the weight sliders in app.py, without zero: a team whose
+# games all carry zero weight makes the Massey system singular.
+WEIGHT_BOUNDS = (0.05, 2.0)
+
+# Fraction of the season's games (the latest ones) held out for scoring
+HOLDOUT_FRACTION = 0.2
+
+# Candidates rated together in one process_batch call per task
+CANDIDATES_PER_TASK = 50
+
+
+def holdout_split(
+        games: pd.DataFrame,
+        fraction: float = HOLDOUT_FRACTION
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Split on a day boundary so no day is partly trained on
+    days = games["days_since_timestart"].to_numpy()
+    cutoff = np.quantile(days, 1 - fraction)
+    train = games[days < cutoff].reset_index(drop=True)
+    test = games[days >= cutoff].reset_index(drop=True)
+    return train, test
+
+
+class Evaluator:
+    """
+    Accuracy of candidate options on held-out games. Everything that does
+    not depend on the options (team indices, game locations, segment
+    indices) is computed once and shared by all candidates.
+    """
+
+    def __init__(self, games: pd.DataFrame, teams: pd.DataFrame, method: str):
+        train, test = holdout_split(games)
+        self.ranker = RANKERS[method](train, teams, RankingOptions())
+
+        team_1 = test["team_1_index"].to_numpy()
+        team_2 = test["team_2_index"].to_numpy()
+        team_1_score = test["team_1_score"].to_numpy()
+        team_2_score = test["team_2_score"].to_numpy()
+        team_1_win = team_1_score > team_2_score
+        decided = team_1_score != team_2_score
+
+        self.winner_index = np.where(team_1_win, team_1, team_2)[decided]
+        self.loser_index = np.where(team_1_win, team_2, team_1)[decided]
+
+    def accuracy(self, options_list: list[RankingOptions]) -> np.ndarray:
+        try:
+            ratings = self.ranker.process_batch(options_list)
+        except np.linalg.LinAlgError:
+            # One singular candidate fails the whole batch; retry one by
+            # one so only that candidate is lost
+            if len(options_list) == 1:
+                return np.array([np.nan])
+            return np.concatenate([
+                self.accuracy([options]) for options in options_list])
+
+        margin = ratings[:, self.winner_index] - ratings[:, self.loser_index]
+        # A tie in the ratings is a coin flip
+        return np.mean((margin > 0) + 0.5 * (margin == 0), axis=1)
+
+
+# One Evaluator per worker process, built once by the pool initializer
+_evaluator = None
+
+
+def _init_worker(games: pd.DataFrame, teams: pd.DataFrame, method: str):
+    global _evaluator
+    _evaluator = Evaluator(games, teams, method)
+
+
+def _accuracy_task(options_list: list[RankingOptions]) -> np.ndarray:
+    return _evaluator.accuracy(options_list)
+
+
+def _params(options: RankingOptions) -> tuple[float, ...]:
+    return (
+        options.weight_home_win,
+        options.weight_away_win,
+        options.weight_neutral_win,
+        *options.segment_weights,
+    )
+
+
+def _options(params: tuple[float, ...]) -> RankingOptions:
+    return RankingOptions(*params[:3], segment_weights=list(params[3:]))
+
+
+class Search:
+    """
+    Evaluates candidates in parallel and remembers every result, so a
+    configuration visited twice (e.g. by coordinate descent) is only
+    rated once.
+    """
+
+    def __init__(
+            self,
+            games: pd.DataFrame,
+            teams: pd.DataFrame,
+            method: str = "Colley",
+            workers: int = None
+    ):
+        self.method = method
+        self.results = {}
+        if workers == 1:
+            _init_worker(games, teams, method)
+            self.pool = None
+        else:
+            self.pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(games, teams, method)
+            )
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def evaluate(self, options_list: list[RankingOptions]) -> np.ndarray:
+        keys = [_params(options) for options in options_list]
+        new = list(dict.fromkeys(k for k in keys if k not in self.results))
+
+        chunks = [
+            [_options(k) for k in new[start:start + CANDIDATES_PER_TASK]]
+            for start in range(0, len(new), CANDIDATES_PER_TASK)
+        ]
+        mapper = map if self.pool is None else self.pool.map
+        for chunk, accuracy in zip(chunks, mapper(_accuracy_task, chunks)):
+            for options, value in zip(chunk, accuracy):
+                self.results[_params(options)] = value
+
+        return np.array([self.results[k] for k in keys])
+
+    def table(self) -> pd.DataFrame:
+        """
+        Every configuration evaluated so far, best first.
+        """
+        df = pd.DataFrame([
+            {
+                "weight_home_win": params[0],
+                "weight_away_win": params[1],
+                "weight_neutral_win": params[2],
+                "segment_weights": list(params[3:]),
+                "accuracy": accuracy,
+            }
+            for params, accuracy in self.results.items()
+        ])
+        df.insert(0, "method", self.method)
+        df.sort_values(
+            by="accuracy", ascending=False, inplace=True, kind="stable")
+        df.reset_index(drop=True, inplace=True)
+        return df
+
+
+def grid_candidates(
+        location_values: list[float],
+        segment_values: list[float],
+        num_segments: int = 1
+) -> list[RankingOptions]:
+    """
+    Every combination of the given values for the three location weights
+    and each of the `num_segments` segment weights.
+    """
+    return [
+        _options(params)
+        for params in itertools.product(
+            *[location_values] * 3, *[segment_values] * num_segments)
+    ]
+
+
+def random_candidates(
+        num_candidates: int,
+        num_segments: int = 1,
+        bounds: tuple[float, float] = WEIGHT_BOUNDS,
+        seed: int = None
+) -> list[RankingOptions]:
+    rng = np.random.default_rng(seed)
+    params = rng.uniform(*bounds, size=(num_candidates, 3 + num_segments))
+    return [_options(tuple(p.round(3))) for p in params]
+
+
+def grid_search(search: Search, candidates: list[RankingOptions]):
+    search.evaluate(candidates)
+    return search.table()
+
+
+def coordinate_descent(
+        search: Search,
+        start: RankingOptions = None,
+        num_segments: int = 1,
+        step: float = 0.5,
+        min_step: float = 0.01,
+        bounds: tuple[float, float] = WEIGHT_BOUNDS,
+        max_sweeps: int = 20
+) -> pd.DataFrame:
+    """
+    Improve one weight at a time. Each sweep tries every weight at
+    +/- 1, 2 and 4 steps from its current value (all of them as one
+    parallel batch) and moves each weight to its best value. If the weights
+    interact so that the combined move scores worse than the best single
+    move, the sweep takes that move instead. The step is halved whenever a
+    sweep finds nothing better.
+    """
+    if start is None:
+        start = RankingOptions(segment_weights=[1] * num_segments)
+    best = _params(start)
+    best_accuracy = search.evaluate([start])[0]
+
+    for _ in range(max_sweeps):
+        if step < min_step:
+            break
+
+        moves = step * np.array([-4, -2, -1, 1, 2, 4])
+        candidates = []
+        for i in range(len(best)):
+            for value in np.clip(best[i] + moves, *bounds).round(3):
+                candidates.append(best[:i] + (value,) + best[i + 1:])
+        # Singular candidates (NaN) never win
+        accuracy = np.nan_to_num(np.reshape(
+            search.evaluate([_options(c) for c in candidates]),
+            (len(best), len(moves))), nan=-np.inf)
+
+        # Best value of each weight, where it beats the current one
+        combined = list(best)
+        for i, j in enumerate(accuracy.argmax(axis=1)):
+            if accuracy[i, j] > best_accuracy:
+                combined[i] = candidates[i * len(moves) + j][i]
+        combined = tuple(combined)
+        if combined == best:
+            step /= 2
+            continue
+
+        i, j = np.unravel_index(accuracy.argmax(), accuracy.shape)
+        best, best_accuracy = candidates[i * len(moves) + j], accuracy[i, j]
+        if combined != best:
+            combined_accuracy = search.evaluate([_options(combined)])[0]
+            if combined_accuracy >= best_accuracy:
+                best, best_accuracy = combined, combined_accuracy
+
+    return search.table()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("strategy", choices=["grid", "random", "descent"])
+    parser.add_argument("--method", choices=list(RANKERS), default="Colley")
+    parser.add_argument("--season", type=int, default=CURRENT_SEASON)
+    parser.add_argument("--segments", type=int, default=1)
+    parser.add_argument("--candidates", type=int, default=1000)
+    parser.add_argument(
+        "--values", type=float, nargs="+", default=[0.5, 1.0, 1.5])
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    games, teams = load_season(args.season)
+    with Search(games, teams, args.method, args.workers) as search:
+        if args.strategy == "grid":
+            table = grid_search(search, grid_candidates(
+                args.values, args.values, args.segments))
+        elif args.strategy == "random":
+            table = grid_search(search, random_candidates(
+                args.candidates, args.segments, seed=args.seed))
+        else:
+            table = coordinate_descent(search, num_segments=args.segments)
+    print(table.head(args.top).to_string())